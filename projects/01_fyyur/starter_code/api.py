@@ -0,0 +1,173 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import hashlib
+import time
+from functools import wraps
+from flask import Blueprint, current_app, request, jsonify, abort
+from queries import (
+    venue_listing, artist_listing, listing_page_size,
+    venue_profile, artist_profile, find_venues, find_artists,
+    show_listing, parse_time
+)
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# upcoming/past splits change as time passes without any write, so their
+# ETags also roll over once per bucket
+TIME_BUCKET_SECONDS = 60
+
+
+def conditional(*tables, time_sensitive=False):
+    '''
+    answers If-None-Match with 304 from the table versions alone (one
+    read of table_versions), before the view runs; other responses get a
+    weak ETag
+    '''
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            cache = current_app.extensions['fragment_cache']
+            parts = [request.full_path]
+            parts += ['%s=%s' % pair
+                      for pair in zip(tables, cache.versions.get(tables))]
+            if time_sensitive:
+                parts.append(str(int(time.time() // TIME_BUCKET_SECONDS)))
+            etag = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = f(*args, **kwargs)
+            response.set_etag(etag, weak=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def _page_args():
+    return (request.args.get('after'),
+            listing_page_size(request.args.get('limit', type=int)))
+
+
+def _show(show):
+    return {key: value.isoformat() if key == 'time' else value
+            for key, value in show._asdict().items()}
+
+
+def _profile(profile, entity, fields):
+    return jsonify({
+        'success': True,
+        entity: {field: getattr(profile[entity], field) for field in fields},
+        'upcoming_shows': [_show(show) for show in profile['upcoming_shows']],
+        'past_shows': [_show(show) for show in profile['past_shows']],
+        'upcoming_shows_count': profile['upcoming_shows_count'],
+        'past_shows_count': profile['past_shows_count'],
+    })
+
+
+def _search(find):
+    return jsonify(dict(find(request.args.get('search_term', ''),
+                             request.args.get('page', 1, type=int)),
+                        success=True))
+
+
+@api.route('/venues')
+@conditional('venue', 'show')
+def venues():
+    after, limit = _page_args()
+    try:
+        areas, next_cursor = venue_listing(after, limit)
+    except ValueError:
+        abort(400)
+    return jsonify({'success': True, 'areas': areas,
+                    'next_cursor': next_cursor})
+
+
+@api.route('/venues/<int:venue_id>')
+@conditional('venue', 'artist', 'show', time_sensitive=True)
+def venue(venue_id):
+    profile = venue_profile(venue_id)
+    if profile is None:
+        abort(404)
+    return _profile(profile, 'venue', (
+        'id', 'name', 'city', 'state', 'address', 'phone', 'genres',
+        'image_link', 'facebook_link', 'seeking_talent',
+        'seeking_talent_description'))
+
+
+@api.route('/venues/search')
+@conditional('venue', 'show')
+def search_venues():
+    return _search(find_venues)
+
+
+@api.route('/artists')
+@conditional('artist', 'show')
+def artists():
+    after, limit = _page_args()
+    try:
+        artists, next_cursor = artist_listing(after, limit)
+    except ValueError:
+        abort(400)
+    return jsonify({'success': True, 'artists': artists,
+                    'next_cursor': next_cursor})
+
+
+@api.route('/artists/<int:artist_id>')
+@conditional('venue', 'artist', 'show', time_sensitive=True)
+def artist(artist_id):
+    profile = artist_profile(artist_id)
+    if profile is None:
+        abort(404)
+    return _profile(profile, 'artist', (
+        'id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+        'website_link', 'facebook_link', 'seeking_venues',
+        'seeking_venues_description'))
+
+
+@api.route('/artists/search')
+@conditional('artist', 'show')
+def search_artists():
+    return _search(find_artists)
+
+
+@api.route('/shows')
+@conditional('venue', 'artist', 'show', time_sensitive=True)
+def shows():
+    after, limit = _page_args()
+    try:
+        listing = show_listing(request.args.get('window', 'upcoming'),
+                               after, limit,
+                               parse_time(request.args.get('start')),
+                               parse_time(request.args.get('end')))
+    except ValueError:
+        abort(400)
+    return jsonify({
+        'success': True,
+        'window': listing['window'],
+        'shows': [_show(show) for show in listing['shows']],
+        'next_cursor': listing['next_cursor'],
+    })
+
+
+@api.errorhandler(400)
+def bad_request(error):
+    return jsonify({
+        "success": False,
+        "error": 400,
+        "message": "Bad request"
+    }), 400
+
+
+@api.errorhandler(404)
+def not_found(error):
+    return jsonify({
+        "success": False,
+        "error": 404,
+        "message": "Not found"
+    }), 404
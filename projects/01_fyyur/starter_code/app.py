@@ -3,11 +3,11 @@
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
+import click
 from flask import (
-    Flask, render_template, request, Response, flash, redirect, url_for
+    Flask, render_template, request, Response, flash, redirect, url_for, abort
 )
+from markupsafe import Markup
 from flask_moment import Moment
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
@@ -17,6 +17,17 @@ from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from models import *
+from queries import (
+    venue_listing, artist_listing, listing_page_size,
+    venue_profile, artist_profile, find_venues, find_artists,
+    show_listing, parse_time
+)
+from filters import format_datetime
+from cache import make_fragment_cache
+from bulk_import import import_file, IMPORT_KINDS, IMPORT_BATCH_SIZE
+from counters import rollover_show_counters, reconcile_show_counters
+from api import api
+from instrumentation import init_query_stats
 from config import SQLALCHEMY_DATABASE_URI
 #----------------------------------------------------------------------------#
 # App Config.
@@ -27,6 +38,7 @@ moment = Moment(app)
 app.config.from_object('config')
 app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
 db.init_app(app)
+init_query_stats(app)
 
 migrate = Migrate(app, db)
 
@@ -34,17 +46,55 @@ migrate = Migrate(app, db)
 # Filters.
 #----------------------------------------------------------------------------#
 
+app.jinja_env.filters['datetime'] = format_datetime
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
-
+#----------------------------------------------------------------------------#
+# Fragment cache.
+#----------------------------------------------------------------------------#
 
-app.jinja_env.filters['datetime'] = format_datetime
+# table versions live in the database, so bumps from other workers and
+# from the flask commands below reach this process; the JSON API derives
+# its ETags from the same versions
+fragment_cache = make_fragment_cache(app.config, TableVersions())
+app.extensions['fragment_cache'] = fragment_cache
+app.register_blueprint(api)
+
+
+def render_page(page, key, template, load):
+    # only the content block is cached; the layout around it (flashed
+    # messages, active nav item) is rendered per request
+    cached = fragment_cache.get(key)
+    if cached is None:
+        context = load()
+        if context is None:
+            abort(404)
+        cached = json.dumps({
+            'title': context.get('title'),
+            'html': render_template(template, **context)
+        })
+        fragment_cache.set(key, cached, context.get('expires_in'))
+    cached = json.loads(cached)
+    return render_template(page, title=cached['title'],
+                           fragment=Markup(cached['html']))
+
+
+def seconds_until(moment):
+    if moment is None:
+        return None
+    return max((moment - datetime.now()).total_seconds(), 1)
+
+
+def seconds_until_next_show(upcoming_shows):
+    # a past/upcoming split goes stale when its next show starts
+    if not upcoming_shows:
+        return None
+    return seconds_until(upcoming_shows[0].time)
+
+
+# a profile shows the names and images of the venues or artists it has
+# shows with, so it is versioned by all three tables, like its API ETag;
+# a delete from one process would not reach the others' memory caches
+PROFILE_TABLES = ('venue', 'artist', 'show')
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -61,27 +111,42 @@ def index():
 
 @app.route('/venues')
 def venues():
-    return render_template('pages/venues.html', venues=Venue.query.all())
+    after = request.args.get('after')
+    limit = listing_page_size(request.args.get('limit', type=int))
+
+    def load():
+        try:
+            areas, next_cursor = venue_listing(after, limit)
+        except ValueError:
+            abort(400)
+        return {'areas': areas, 'next_cursor': next_cursor, 'limit': limit}
+
+    key = fragment_cache.versioned_key('venues', ('venue', 'show'),
+                                       after, limit)
+    return render_page('pages/venues.html', key, 'fragments/venues.html', load)
 
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-    search_term = request.form.get('search_term', '').capitalize()
-    response = Venue.query.filter(Venue.name.contains(search_term)).all()
+    search_term = request.form.get('search_term', '')
+    page = request.form.get('page', 1, type=int)
     return render_template('pages/search_venues.html',
-                           results=response,
-                           search_term=search_term)
+                           search_term=search_term,
+                           **find_venues(search_term, page))
 
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
-    show_query = Show.query.outerjoin(Venue, Venue.id == Show.venue_id).outerjoin(
-        Artist, Artist.id == Show.artist_id).filter(Show.venue_id == venue_id)
-    venue_query = Venue.query.filter_by(id=venue_id).first()
-    time = datetime.now()
-    future_shows = show_query.filter(Show.time >= time).all()
-    past_shows = show_query.filter(Show.time < time).all()
-    return render_template('pages/show_venue.html', venue=venue_query, past_shows=past_shows, future_shows=future_shows)
+    def load():
+        profile = venue_profile(venue_id)
+        if profile is not None:
+            profile['expires_in'] = seconds_until_next_show(
+                profile['upcoming_shows'])
+        return profile
+
+    key = fragment_cache.versioned_key('venue', PROFILE_TABLES, venue_id)
+    return render_page('pages/show_venue.html', key,
+                       'fragments/show_venue.html', load)
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -107,6 +172,7 @@ def create_venue_submission():
                       phone=phone, genres=genres, facebook_link=facebook_link)
         db.session.add(venue)
         db.session.commit()
+        fragment_cache.bump('venue')
         # on successful db insert, flash success
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except:
@@ -124,6 +190,7 @@ def delete_venue(venue_id):
         venue = Venue.query.get_or_404(venue_id)
         db.session.delete(venue)
         db.session.commit()
+        fragment_cache.bump('venue', 'show')
     except:
         db.session.rollback()
     finally:
@@ -134,29 +201,45 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-    return render_template('pages/artists.html', artists=Artist.query.all())
+    after = request.args.get('after')
+    limit = listing_page_size(request.args.get('limit', type=int))
+
+    def load():
+        try:
+            artists, next_cursor = artist_listing(after, limit)
+        except ValueError:
+            abort(400)
+        return {'artists': artists, 'next_cursor': next_cursor,
+                'limit': limit}
+
+    key = fragment_cache.versioned_key('artists', ('artist', 'show'),
+                                       after, limit)
+    return render_page('pages/artists.html', key, 'fragments/artists.html',
+                       load)
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-    search_term = request.form.get('search_term', '').capitalize()
-    response = Artist.query.filter(Artist.name.contains(search_term)).all()
+    search_term = request.form.get('search_term', '')
+    page = request.form.get('page', 1, type=int)
     return render_template('pages/search_artists.html',
-                           results=response,
-                           search_term=search_term)
+                           search_term=search_term,
+                           **find_artists(search_term, page))
 
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-    show_query = Show.query.outerjoin(
-        Artist, Artist.id == Show.artist_id).outerjoin(Venue, Venue.id == Show.venue_id).filter(Show.artist_id == artist_id)
-    artist_query = Artist.query.filter_by(id=artist_id).first()
-    time = datetime.now()
-    future_shows = show_query.filter(Show.time >= time).all()
-    past_shows = show_query.filter(Show.time < time).all()
-    return render_template('pages/show_artist.html',
-                           artist=artist_query, future_shows=future_shows,
-                           past_shows=past_shows)
+    def load():
+        profile = artist_profile(artist_id)
+        if profile is not None:
+            profile['title'] = profile['artist'].name
+            profile['expires_in'] = seconds_until_next_show(
+                profile['upcoming_shows'])
+        return profile
+
+    key = fragment_cache.versioned_key('artist', PROFILE_TABLES, artist_id)
+    return render_page('pages/show_artist.html', key,
+                       'fragments/show_artist.html', load)
 
 
 #  Update
@@ -179,6 +262,7 @@ def edit_artist_submission(artist_id):
         artist.genres = request.form.getlist("genres")
         artist.facebook_link = request.form.get("facebook_link")
         db.session.commit()
+        fragment_cache.bump('artist')
         flash('Success!' + artist.name + ' has been updated.')
     except:
         db.session.rollback()
@@ -206,6 +290,7 @@ def edit_venue_submission(venue_id):
         venue.genres = request.form.getlist("genres")
         venue.facebook_link = request.form.get("facebook_link")
         db.session.commit()
+        fragment_cache.bump('venue')
         flash('Success!' + venue.name + ' has been updated.')
     except:
         db.session.rollback()
@@ -236,6 +321,7 @@ def create_artist_submission():
                         phone=phone, genres=genres, facebook_link=facebook_link)
         db.session.add(artist)
         db.session.commit()
+        fragment_cache.bump('artist')
         # on successful db insert, flash success
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except:
@@ -252,10 +338,25 @@ def create_artist_submission():
 
 @app.route('/shows')
 def shows():
-    return render_template('pages/shows.html',
-                           shows=Show.query.outerjoin(
-                               Venue, Venue.id == Show.venue_id)
-                           .outerjoin(Artist, Artist.id == Show.artist_id).all())
+    window = request.args.get('window', 'upcoming')
+    after = request.args.get('after')
+    start = request.args.get('start')
+    end = request.args.get('end')
+    limit = listing_page_size(request.args.get('limit', type=int))
+
+    def load():
+        try:
+            listing = show_listing(window, after, limit,
+                                   parse_time(start), parse_time(end))
+        except ValueError:
+            abort(400)
+        listing.update(limit=limit, start=start, end=end)
+        listing['expires_in'] = seconds_until(listing['next_show_at'])
+        return listing
+
+    key = fragment_cache.versioned_key('shows', ('show', 'venue', 'artist'),
+                                       window, after, limit, start, end)
+    return render_page('pages/shows.html', key, 'fragments/shows.html', load)
 
 
 @app.route('/shows/create')
@@ -268,11 +369,12 @@ def create_shows():
 def create_show_submission():
     try:
         artist_id = request.form.get("artist_id")
-        venue_id = request.form.get("artist_id")
-        start_time = request.form.get("start_time")
+        venue_id = request.form.get("venue_id")
+        start_time = parse_time(request.form.get("start_time"))
         show = Show(artist_id=artist_id, venue_id=venue_id, time=start_time)
         db.session.add(show)
         db.session.commit()
+        fragment_cache.bump('show')
         # on successful db insert, flash success
         flash('Show was successfully listed!')
     except:
@@ -282,6 +384,41 @@ def create_show_submission():
         return render_template('pages/home.html')
 
 
+#  Commands
+#  ----------------------------------------------------------------
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(sorted(IMPORT_KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+@click.option('--rejects', type=click.Path(dir_okay=False),
+              help='Write rejected rows to this file as NDJSON.')
+def import_data(kind, path, batch_size, rejects):
+    """Bulk-load venues, artists or shows from a CSV or NDJSON file."""
+    report = import_file(kind, path, batch_size, rejects)
+    if kind == 'shows':
+        # COPY and executemany bypass the ORM events that keep counters;
+        # the rebuild bumps the venue and artist versions itself
+        reconcile_show_counters()
+    fragment_cache.bump(IMPORT_KINDS[kind][0].__tablename__)
+    click.echo('{accepted} {kind} imported, {rejected} rejected in '
+               '{elapsed:.1f}s ({rows_per_second:.0f} rows/s)'.format(**report))
+
+
+@app.cli.command('rollover-shows')
+def rollover_shows():
+    """Move shows that have started from upcoming to past counters."""
+    updated = rollover_show_counters()
+    click.echo('{} venue and artist counters rolled over'.format(updated))
+
+
+@app.cli.command('reconcile-show-counters')
+def reconcile_counters():
+    """Rebuild upcoming/past show counters from the show table."""
+    updated = reconcile_show_counters()
+    click.echo('{} venue and artist counters rebuilt'.format(updated))
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -0,0 +1,66 @@
+'''
+Micro-benchmark for the `datetime` Jinja filter.
+
+Compares the original parse-every-call implementation with
+filters.format_datetime on the mix a show-heavy page produces: a few
+hundred show times, each rendered several times. The filter's cache is
+cleared before every repeat, so the first render of the page is timed
+cold (every value parsed and formatted once) and the later renders warm
+(cache hits only); both are reported per call.
+
+    $ python benchmarks/datetime_filter.py
+'''
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from filters import format_datetime, _format_datetime  # noqa: E402
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def main(shows=300, renders=5, repeat=5):
+    start = datetime(2020, 1, 1, 20, 0)
+    times = [start + timedelta(hours=6 * i) for i in range(shows)]
+    strings = [str(t) for t in times]
+
+    def run(fn, values):
+        def render(passes):
+            for _ in range(passes):
+                for value in values:
+                    fn(value, 'full')
+        cold, warm = [], []
+        for _ in range(repeat):
+            _format_datetime.cache_clear()
+            cold.append(timeit.timeit(lambda: render(1), number=1))
+            warm.append(timeit.timeit(lambda: render(renders - 1), number=1))
+        return (min(cold) / shows,
+                min(warm) / (shows * max(renders - 1, 1)))
+
+    results = [
+        ('legacy, str input', run(legacy_format_datetime, strings)),
+        ('cached, str input', run(format_datetime, strings)),
+        ('cached, datetime input', run(format_datetime, times)),
+    ]
+    baseline_cold, baseline_warm = results[0][1]
+    print('{:<24} {:>16} {:>16}'.format('', 'cold', 'warm'))
+    for label, (cold, warm) in results:
+        print('{:<24} {:>7.2f} us {:>4.1f}x {:>7.2f} us {:>4.1f}x'.format(
+            label, cold * 1e6, baseline_cold / cold,
+            warm * 1e6, baseline_warm / warm))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import time
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, default_venue_img
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# Rows are validated with the same WTForms rules as the create forms, then
+# written a batch at a time: COPY on PostgreSQL, executemany elsewhere.
+
+IMPORT_BATCH_SIZE = 5000
+
+IMPORT_KINDS = {
+    'venues': (Venue, VenueForm, ['name', 'city', 'state', 'address', 'phone',
+                                  'image_link', 'genres', 'facebook_link']),
+    'artists': (Artist, ArtistForm, ['name', 'city', 'state', 'phone',
+                                     'image_link', 'genres', 'facebook_link']),
+    'shows': (Show, ShowForm, ['venue_id', 'artist_id', 'time']),
+}
+
+
+def read_records(path):
+    '''
+    yields (line number, record dict) from a .csv file or an NDJSON file;
+    in CSV files genres are a single comma-separated column
+    '''
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            reader = csv.DictReader(f)
+            for record in reader:
+                if record.get('genres'):
+                    record['genres'] = [
+                        genre.strip() for genre in record['genres'].split(',')]
+                yield reader.line_num, record
+        else:
+            for line_num, line in enumerate(f, 1):
+                if line.strip():
+                    yield line_num, json.loads(line)
+
+
+def _formdata(record):
+    formdata = MultiDict()
+    for key, value in record.items():
+        if value is None:
+            continue
+        if isinstance(value, list):
+            for item in value:
+                formdata.add(key, str(item))
+        else:
+            formdata.add(key, str(value))
+    if 'start_time' not in formdata and 'time' in formdata:
+        formdata['start_time'] = formdata['time']
+    return formdata
+
+
+def _row(kind, form, record):
+    if kind == 'shows':
+        return {
+            'venue_id': record.get('venue_id'),
+            'artist_id': record.get('artist_id'),
+            'venue_name': record.get('venue_name'),
+            'artist_name': record.get('artist_name'),
+            'time': form.start_time.data,
+        }
+    row = {field: form[field].data for field in IMPORT_KINDS[kind][2]}
+    row['image_link'] = row['image_link'] or (
+        default_venue_img if kind == 'venues' else None)
+    return row
+
+
+def _resolve(model, rows, id_key, name_key):
+    '''
+    replaces the id or name of a referenced venue or artist with a verified
+    id, or None when there is no such record, using one query per batch
+    '''
+    ids, names = set(), set()
+    for row in rows:
+        try:
+            row[id_key] = int(row[id_key]) if row[id_key] else None
+        except (TypeError, ValueError):
+            row[id_key] = -1
+        if row[id_key] is not None:
+            ids.add(row[id_key])
+        elif row[name_key]:
+            names.add(row[name_key])
+    known = set()
+    if ids:
+        known = {id for (id,) in db.session.query(model.id).filter(
+            model.id.in_(ids))}
+    by_name = {}
+    if names:
+        # names are not unique; the oldest record with the name wins
+        by_name = dict(db.session.query(model.name, db.func.min(
+            model.id)).filter(model.name.in_(names)).group_by(model.name))
+    for row in rows:
+        if row[id_key] is None:
+            row[id_key] = by_name.get(row[name_key])
+        elif row[id_key] not in known:
+            row[id_key] = None
+
+
+def _pg_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, list):
+        return '{' + ','.join('"' + item.replace('\\', '\\\\').replace(
+            '"', '\\"') + '"' for item in value) + '}'
+    return value
+
+
+def _copy(table, columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_pg_value(row[column]) for column in columns])
+    buffer.seek(0)
+    # COPY runs on the session's own connection, inside its transaction
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv, '
+                           "NULL '\\N')".format(
+                               table.name, ', '.join(columns)), buffer)
+    finally:
+        cursor.close()
+
+
+def _column_defaults(model, columns):
+    # scalar Python-side defaults (seeking_talent, seeking_venues) of the
+    # columns the import does not set: executemany fills them in, COPY
+    # would leave them NULL
+    return {column.name: column.default.arg
+            for column in model.__table__.columns
+            if column.name not in columns and column.default is not None
+            and column.default.is_scalar and column.server_default is None}
+
+
+def _write(model, columns, rows):
+    defaults = _column_defaults(model, columns)
+    rows = [dict(defaults, **{column: row[column] for column in columns})
+            for row in rows]
+    columns = columns + sorted(defaults)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # batches may legitimately outlast the per-request statement_timeout
+        db.session.execute('SET LOCAL statement_timeout = 0')
+        _copy(model.__table__, columns, rows)
+    else:
+        db.session.execute(model.__table__.insert(), rows)
+    db.session.commit()
+
+
+def import_file(kind, path, batch_size=IMPORT_BATCH_SIZE, rejects=None):
+    '''
+    streams records from path into the table for kind; returns a report
+    with counts and elapsed time. Rejected records are written to
+    rejects as NDJSON if given.
+    '''
+    model, form_class, columns = IMPORT_KINDS[kind]
+    form = form_class(formdata=None, meta={'csrf': False})
+    report = {'kind': kind, 'accepted': 0, 'rejected': 0}
+    reject_file = open(rejects, 'w', encoding='utf-8') if rejects else None
+
+    def reject(line_num, record, errors):
+        report['rejected'] += 1
+        if reject_file:
+            reject_file.write(json.dumps({
+                'line': line_num, 'errors': errors, 'record': record},
+                default=str) + '\n')
+
+    def flush(batch):
+        if kind == 'shows':
+            rows = [row for _, _, row in batch]
+            _resolve(Venue, rows, 'venue_id', 'venue_name')
+            _resolve(Artist, rows, 'artist_id', 'artist_name')
+            resolved = []
+            for line_num, record, row in batch:
+                if row['venue_id'] is None or row['artist_id'] is None:
+                    reject(line_num, record,
+                           {'reference': ['unknown venue or artist']})
+                    continue
+                resolved.append((line_num, record, row))
+            batch = resolved
+        if batch:
+            _write(model, columns, [row for _, _, row in batch])
+            report['accepted'] += len(batch)
+
+    started = time.perf_counter()
+    batch = []
+    try:
+        for line_num, record in read_records(path):
+            formdata = _formdata(record)
+            if kind == 'shows' and not formdata.get('start_time'):
+                # ShowForm would otherwise fall back to its default of today
+                reject(line_num, record,
+                       {'start_time': ['This field is required.']})
+                continue
+            form.process(formdata)
+            if not form.validate():
+                reject(line_num, record, form.errors)
+                continue
+            batch.append((line_num, record, _row(kind, form, record)))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        flush(batch)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if reject_file:
+            reject_file.close()
+    report['elapsed'] = time.perf_counter() - started
+    report['rows_per_second'] = (
+        (report['accepted'] + report['rejected']) / report['elapsed']
+        if report['elapsed'] else 0)
+    return report
@@ -0,0 +1,257 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import fcntl
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+# Every backend stores string values under string keys with an optional
+# ttl in seconds, and keeps integer counters that are never evicted.
+
+
+class MemoryBackend:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def counter(self, key):
+        with self._lock:
+            return self._counter(key)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counter(key) + 1
+            return self._counters[key]
+
+    def _counter(self, key):
+        # start from a random value so a restarted process never hands out
+        # a version an earlier process already used
+        if key not in self._counters:
+            self._counters[key] = random.getrandbits(32)
+        return self._counters[key]
+
+
+class FileBackend:
+    # entries are swept every SWEEP_EVERY sets: the least recently used
+    # beyond max_entries are removed, oldest modification time first
+    SWEEP_EVERY = 100
+
+    def __init__(self, directory, max_entries=1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._counters = os.path.join(directory, 'counters')
+        self._lock = threading.Lock()
+        self._sets = 0
+        os.makedirs(self._counters, exist_ok=True)
+
+    def _path(self, key, directory=None):
+        return os.path.join(directory or self.directory,
+                            hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _read(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path, entry):
+        tmp = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        path = self._path(key)
+        entry = self._read(path)
+        if entry is None:
+            return None
+        if entry['expires'] is not None and entry['expires'] <= time.time():
+            self.delete(key)
+            return None
+        try:
+            # the sweep evicts by modification time, so a hit renews it
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['value']
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        self._write(self._path(key), {'value': value, 'expires': expires})
+        with self._lock:
+            self._sets += 1
+            sweep = self._sets % self.SWEEP_EVERY == 0
+        if sweep:
+            self._sweep()
+
+    def delete(self, *keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _sweep(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file():
+                    entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def counter(self, key):
+        entry = self._read(self._path(key, self._counters))
+        return entry['value'] if entry else 0
+
+    def incr(self, key):
+        # other processes share the directory, so the read-modify-write
+        # is guarded by an exclusive lock on a file next to the counters
+        with self._lock, open(os.path.join(self._counters, '.lock'),
+                              'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            value = self.counter(key) + 1
+            self._write(self._path(key, self._counters),
+                        {'value': value, 'expires': None})
+            return value
+
+
+class RedisBackend:
+    def __init__(self, url):
+        # redis is only needed when this backend is configured
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*keys)
+
+    def counter(self, key):
+        return int(self._client.get('counter:' + key) or 0)
+
+    def incr(self, key):
+        return self._client.incr('counter:' + key)
+
+#----------------------------------------------------------------------------#
+# Fragment cache.
+#----------------------------------------------------------------------------#
+
+
+class BackendVersions:
+    # table versions kept as counters in the cache backend itself; they
+    # are only shared between processes when the backend is
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, tables):
+        return [self.backend.counter('version:' + table) for table in tables]
+
+    def bump(self, *tables):
+        for table in tables:
+            self.backend.incr('version:' + table)
+
+
+class FragmentCache:
+    '''
+    Rendered HTML fragments keyed by page and arguments.
+
+    Fragment keys embed the versions of the tables the fragment was
+    rendered from, so bump('venue') retires every listing page and
+    profile built from the venue table at once, in every process that
+    reads the same versions. Versions come from the versions store, the
+    backend's own counters by default.
+    '''
+
+    def __init__(self, backend, default_ttl=None, versions=None):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.versions = versions or BackendVersions(backend)
+
+    def version(self, table):
+        return self.versions.get([table])[0]
+
+    def bump(self, *tables):
+        self.versions.bump(*tables)
+
+    def versioned_key(self, name, tables, *parts):
+        versions = '.'.join(str(version)
+                            for version in self.versions.get(tables))
+        return ':'.join([name, versions] + [str(part) for part in parts])
+
+    def get(self, key):
+        return self.backend.get('fragment:' + key)
+
+    def set(self, key, value, ttl=None):
+        if ttl is None or (self.default_ttl and ttl > self.default_ttl):
+            ttl = self.default_ttl
+        self.backend.set('fragment:' + key, value, ttl)
+
+    def delete(self, *keys):
+        self.backend.delete(*['fragment:' + key for key in keys])
+
+
+def make_fragment_cache(config, versions=None):
+    backend = config.get('FRAGMENT_CACHE_BACKEND', 'memory')
+    if backend == 'memory':
+        store = MemoryBackend(config.get('FRAGMENT_CACHE_MAX_ENTRIES', 1024))
+    elif backend == 'file':
+        store = FileBackend(config['FRAGMENT_CACHE_DIR'],
+                            config.get('FRAGMENT_CACHE_MAX_ENTRIES', 1024))
+    elif backend == 'redis':
+        store = RedisBackend(config['FRAGMENT_CACHE_URL'])
+    else:
+        raise ValueError('unknown FRAGMENT_CACHE_BACKEND: ' + backend)
+    return FragmentCache(store, config.get('FRAGMENT_CACHE_TTL'), versions)
@@ -11,3 +11,26 @@ DEBUG = True
 
 # TODO IMPLEMENT DATABASE URL
 SQLALCHEMY_DATABASE_URI = 'postgres://carmellasouthward@localhost:5432/fyyurapp'
+
+# Connection pool. statement_timeout is applied per connection by Postgres.
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 5000))
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+    'connect_args': {
+        'options': '-c statement_timeout=%d' % DB_STATEMENT_TIMEOUT_MS
+    },
+}
+
+# Requests slower than this are logged as warnings with their query count
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+
+# Rendered-fragment cache: 'memory' (in-process LRU), 'file' or 'redis'
+FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'memory')
+FRAGMENT_CACHE_MAX_ENTRIES = 1024
+FRAGMENT_CACHE_DIR = os.path.join(basedir, '.fragment_cache')
+FRAGMENT_CACHE_URL = os.environ.get(
+    'FRAGMENT_CACHE_URL', 'redis://localhost:6379/0')
+FRAGMENT_CACHE_TTL = 3600
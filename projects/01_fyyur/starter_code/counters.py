@@ -0,0 +1,113 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from sqlalchemy import event, select, func, and_, or_, case
+from models import db, Venue, Artist, Show, bump_table_versions
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry upcoming_count, past_count and next_show_at so
+# listings can show them without aggregating shows per row. Inserting or
+# deleting a Show through the ORM adjusts them in the same transaction;
+# rollover_show_counters() moves shows from upcoming to past as time
+# passes, and reconcile_show_counters() rebuilds everything from scratch.
+# Both bump the venue and artist table versions in the same transaction,
+# so every worker's cached listings and ETags pick up the new counts.
+
+COUNTED = ((Venue, 'venue_id'), (Artist, 'artist_id'))
+
+
+def _next_show_at(table, foreign_key, now):
+    return select([func.min(Show.__table__.c.time)]).where(and_(
+        foreign_key == table.c.id,
+        Show.__table__.c.time >= now)).as_scalar()
+
+
+@event.listens_for(Show, 'after_insert')
+def _show_inserted(mapper, connection, show):
+    now = datetime.now()
+    for model, key in COUNTED:
+        table = model.__table__
+        if getattr(show, key) is None:
+            continue
+        if show.time >= now:
+            values = {
+                'upcoming_count': table.c.upcoming_count + 1,
+                'next_show_at': case([(or_(
+                    table.c.next_show_at.is_(None),
+                    table.c.next_show_at > show.time), show.time)],
+                    else_=table.c.next_show_at),
+            }
+        else:
+            values = {'past_count': table.c.past_count + 1}
+        connection.execute(table.update().where(
+            table.c.id == getattr(show, key)).values(**values))
+
+
+@event.listens_for(Show, 'after_delete')
+def _show_deleted(mapper, connection, show):
+    now = datetime.now()
+    for model, key in COUNTED:
+        table = model.__table__
+        if getattr(show, key) is None:
+            continue
+        if show.time >= now:
+            # the row is already gone, so the subquery finds the next show
+            values = {
+                'upcoming_count': table.c.upcoming_count - 1,
+                'next_show_at': _next_show_at(
+                    table, Show.__table__.c[key], now),
+            }
+        else:
+            values = {'past_count': table.c.past_count - 1}
+        connection.execute(table.update().where(
+            table.c.id == getattr(show, key)).values(**values))
+
+
+def _recount(model, key, now, rolled_only):
+    table = model.__table__
+    shows = Show.__table__
+    foreign_key = shows.c[key]
+
+    def count(*conditions):
+        return select([func.count()]).where(
+            and_(foreign_key == table.c.id, *conditions)).as_scalar()
+
+    statement = table.update().values(
+        upcoming_count=count(shows.c.time >= now),
+        past_count=count(shows.c.time < now),
+        next_show_at=_next_show_at(table, foreign_key, now))
+    if rolled_only:
+        statement = statement.where(table.c.next_show_at < now)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # a full rebuild may outlast the per-request statement_timeout
+        db.session.execute('SET LOCAL statement_timeout = 0')
+    return db.session.execute(statement).rowcount
+
+
+def rollover_show_counters(now=None):
+    '''
+    recounts only the venues and artists whose next show has started
+    since the last run; returns the number of rows updated
+    '''
+    now = now or datetime.now()
+    updated = sum(_recount(model, key, now, True) for model, key in COUNTED)
+    if updated:
+        bump_table_versions('venue', 'artist')
+    db.session.commit()
+    return updated
+
+
+def reconcile_show_counters(now=None):
+    '''
+    rebuilds every counter with one set-based UPDATE per table
+    '''
+    now = now or datetime.now()
+    updated = sum(_recount(model, key, now, False) for model, key in COUNTED)
+    bump_table_versions('venue', 'artist')
+    db.session.commit()
+    return updated
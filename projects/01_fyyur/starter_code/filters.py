@@ -0,0 +1,42 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from functools import lru_cache
+import dateutil.parser
+import babel
+import babel.dates
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def _datetime_pattern(format):
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=1)
+def _time_locale():
+    return babel.Locale.parse(babel.dates.LC_TIME or 'en_US_POSIX')
+
+
+@lru_cache(maxsize=4096)
+def _format_datetime(value, format):
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+    if value.tzinfo is None:
+        # babel.dates.format_datetime treats naive values as UTC too
+        value = value.replace(tzinfo=babel.dates.UTC)
+    return _datetime_pattern(format).apply(value, _time_locale())
+
+
+def format_datetime(value, format='medium'):
+    return _format_datetime(value, format)
@@ -0,0 +1,56 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import logging
+import time
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request SQL instrumentation.
+#----------------------------------------------------------------------------#
+
+
+def init_query_stats(app):
+    '''
+    counts the queries each request issues and the time spent in them and
+    logs one line per request through app.logger; requests slower than
+    SLOW_REQUEST_MS are logged as warnings
+    '''
+    threshold_ms = app.config.get('SLOW_REQUEST_MS', 500)
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context,
+                             executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        if has_request_context() and 'db_queries' in g:
+            g.db_queries += 1
+            g.db_seconds += elapsed
+
+    @app.before_request
+    def start_query_stats():
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_seconds = 0.0
+
+    @app.after_request
+    def log_query_stats(response):
+        if 'request_started' not in g:
+            return response
+        total_ms = (time.perf_counter() - g.request_started) * 1000
+        slow = total_ms >= threshold_ms
+        app.logger.log(
+            logging.WARNING if slow else logging.INFO,
+            '%s%s %s %s %d: %d queries, %.1fms db, %.1fms total',
+            'slow request ' if slow else '', request.method,
+            request.full_path.rstrip('?'), request.endpoint,
+            response.status_code, g.db_queries, g.db_seconds * 1000,
+            total_ms)
+        return response
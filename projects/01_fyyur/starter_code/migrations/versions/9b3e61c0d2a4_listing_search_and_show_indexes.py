@@ -0,0 +1,47 @@
+"""listing, search and show indexes
+
+Revision ID: 9b3e61c0d2a4
+Revises: 4f1c2a9d7b10
+Create Date: 2020-06-14 10:41:03.204871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e61c0d2a4'
+down_revision = '4f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venue', 'artist'):
+        op.create_index('ix_%s_listing' % table, table,
+                        ['state', 'city', 'name', 'id'], unique=False)
+        op.create_index('ix_%s_name_trgm' % table, table, ['name'],
+                        unique=False, postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'})
+        op.create_index('ix_%s_city_trgm' % table, table, ['city'],
+                        unique=False, postgresql_using='gin',
+                        postgresql_ops={'city': 'gin_trgm_ops'})
+        op.create_index('ix_%s_genres' % table, table, ['genres'],
+                        unique=False, postgresql_using='gin')
+    op.create_index('ix_show_venue_id_time', 'show', ['venue_id', 'time'],
+                    unique=False)
+    op.create_index('ix_show_artist_id_time', 'show', ['artist_id', 'time'],
+                    unique=False)
+    op.create_index('ix_show_time', 'show', ['time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_time', table_name='show')
+    op.drop_index('ix_show_artist_id_time', table_name='show')
+    op.drop_index('ix_show_venue_id_time', table_name='show')
+    for table in ('artist', 'venue'):
+        op.drop_index('ix_%s_genres' % table, table_name=table)
+        op.drop_index('ix_%s_city_trgm' % table, table_name=table)
+        op.drop_index('ix_%s_name_trgm' % table, table_name=table)
+        op.drop_index('ix_%s_listing' % table, table_name=table)
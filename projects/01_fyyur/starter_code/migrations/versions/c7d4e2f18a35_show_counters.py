@@ -0,0 +1,46 @@
+"""upcoming/past show counters on venue and artist
+
+Revision ID: c7d4e2f18a35
+Revises: 9b3e61c0d2a4
+Create Date: 2020-06-21 09:17:45.630912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d4e2f18a35'
+down_revision = '9b3e61c0d2a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('upcoming_count', sa.Integer(),
+                                       server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_count', sa.Integer(),
+                                       server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_at', sa.DateTime(),
+                                       nullable=True))
+        # same statement as `flask reconcile-show-counters`
+        op.execute('''
+            UPDATE {table} SET
+                upcoming_count = (SELECT count(*) FROM show
+                    WHERE show.{table}_id = {table}.id
+                    AND show.time >= LOCALTIMESTAMP),
+                past_count = (SELECT count(*) FROM show
+                    WHERE show.{table}_id = {table}.id
+                    AND show.time < LOCALTIMESTAMP),
+                next_show_at = (SELECT min(show.time) FROM show
+                    WHERE show.{table}_id = {table}.id
+                    AND show.time >= LOCALTIMESTAMP)
+        '''.format(table=table))
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_column(table, 'next_show_at')
+        op.drop_column(table, 'past_count')
+        op.drop_column(table, 'upcoming_count')
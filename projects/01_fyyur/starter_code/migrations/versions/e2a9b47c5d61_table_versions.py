@@ -0,0 +1,33 @@
+"""table versions for the fragment cache and API ETags
+
+Revision ID: e2a9b47c5d61
+Revises: c7d4e2f18a35
+Create Date: 2020-06-28 11:42:08.214377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a9b47c5d61'
+down_revision = 'c7d4e2f18a35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_versions = op.create_table(
+        'table_versions',
+        sa.Column('name', sa.String(length=80), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    # seeded so that bumps from concurrent processes only ever UPDATE
+    op.bulk_insert(table_versions, [
+        {'name': name, 'version': 0} for name in ('venue', 'artist', 'show')
+    ])
+
+
+def downgrade():
+    op.drop_table('table_versions')
@@ -4,6 +4,7 @@
 
 import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, DDL
 from flask_wtf import Form
 from forms import *
 
@@ -12,11 +13,22 @@ from forms import *
 #----------------------------------------------------------------------------#
 
 db = SQLAlchemy()
+# the trigram search indexes below need pg_trgm
+event.listen(db.metadata, 'before_create', DDL(
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
 default_venue_img = 'https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80'
 
 
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_listing', 'state', 'city', 'name', 'id'),
+        db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venue_city_trgm', 'city', postgresql_using='gin',
+                 postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -30,11 +42,24 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_talent_description = db.Column(db.String(500), nullable=True)
     genres = db.Column(db.ARRAY(db.String(120)), nullable=True)
+    upcoming_count = db.Column(db.Integer, nullable=False, default=0,
+                               server_default='0')
+    past_count = db.Column(db.Integer, nullable=False, default=0,
+                           server_default='0')
+    next_show_at = db.Column(db.DateTime, nullable=True)
     shows = db.relationship("Show", backref='venue')
 
 
 class Artist(db.Model):
     __tablename__ = 'artist'
+    __table_args__ = (
+        db.Index('ix_artist_listing', 'state', 'city', 'name', 'id'),
+        db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artist_city_trgm', 'city', postgresql_using='gin',
+                 postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -47,12 +72,60 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(500), nullable=False)
     seeking_venues = db.Column(db.Boolean, nullable=True, default=False)
     seeking_venues_description = db.Column(db.String(500), nullable=True)
+    upcoming_count = db.Column(db.Integer, nullable=False, default=0,
+                               server_default='0')
+    past_count = db.Column(db.Integer, nullable=False, default=0,
+                           server_default='0')
+    next_show_at = db.Column(db.DateTime, nullable=True)
     shows = db.relationship("Show", backref='artist')
 
 
 class Show(db.Model):
     __tablename__ = 'show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_time', 'venue_id', 'time'),
+        db.Index('ix_show_artist_id_time', 'artist_id', 'time'),
+        db.Index('ix_show_time', 'time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'))
     artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'))
     time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class TableVersion(db.Model):
+    # one row per table, bumped after every write to it; the fragment
+    # cache keys and the API ETags are built from these
+    __tablename__ = 'table_versions'
+    name = db.Column(db.String(80), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+def bump_table_versions(*names):
+    '''
+    adds one to the version of each named table, creating missing rows;
+    the caller commits, so a bump can share the write's transaction
+    '''
+    table = TableVersion.__table__
+    for name in names:
+        updated = db.session.execute(table.update().where(
+            table.c.name == name).values(version=table.c.version + 1))
+        if updated.rowcount == 0:
+            db.session.execute(table.insert().values(name=name, version=1))
+
+
+class TableVersions:
+    '''
+    FragmentCache versions kept in the database, so a bump made by any
+    worker or by a flask command is seen by every other process
+    '''
+
+    def get(self, names):
+        versions = dict(db.session.query(
+            TableVersion.name, TableVersion.version).filter(
+            TableVersion.name.in_(names)))
+        return [versions.get(name, 0) for name in names]
+
+    def bump(self, *names):
+        bump_table_versions(*names)
+        db.session.commit()
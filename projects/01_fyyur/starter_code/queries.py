@@ -0,0 +1,272 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import base64
+import json
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import tuple_, or_, func, cast
+from sqlalchemy.dialects.postgresql import array
+from forms import genre_choices
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Listings.
+#----------------------------------------------------------------------------#
+
+LISTING_PAGE_SIZE = 50
+LISTING_MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(token, width):
+    # raises ValueError for anything that is not a cursor we handed out
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (TypeError, ValueError) as e:
+        raise ValueError('malformed cursor') from e
+    if not isinstance(values, list) or len(values) != width:
+        raise ValueError('malformed cursor')
+    return values
+
+
+def listing_page_size(requested):
+    if requested is None or requested < 1:
+        return LISTING_PAGE_SIZE
+    return min(requested, LISTING_MAX_PAGE_SIZE)
+
+
+def _keyset_page(model, after, limit):
+    # (state, city, name, id) is both the sort order and the cursor, so
+    # every page is a single range scan over ix_<table>_listing
+    key = (model.state, model.city, model.name, model.id)
+    query = db.session.query(*key, model.upcoming_count)
+    if after:
+        values = decode_cursor(after, 4)
+        if (not all(isinstance(value, str) for value in values[:3]) or
+                not isinstance(values[3], int) or
+                isinstance(values[3], bool)):
+            raise ValueError('malformed cursor')
+        query = query.filter(tuple_(*key) > tuple_(*values))
+    rows = query.order_by(*key).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][:4])
+    return rows, next_cursor
+
+
+def venue_listing(after=None, limit=LISTING_PAGE_SIZE):
+    rows, next_cursor = _keyset_page(Venue, after, limit)
+    # rows arrive ordered by (state, city), so grouping is a single pass
+    areas = [{
+        'state': state,
+        'city': city,
+        'venues': [{'id': row.id, 'name': row.name,
+                    'num_upcoming_shows': row.upcoming_count} for row in group]
+    } for (state, city), group in groupby(rows, lambda row: (row.state, row.city))]
+    return areas, next_cursor
+
+
+def artist_listing(after=None, limit=LISTING_PAGE_SIZE):
+    rows, next_cursor = _keyset_page(Artist, after, limit)
+    artists = [{'id': row.id, 'name': row.name,
+                'num_upcoming_shows': row.upcoming_count} for row in rows]
+    return artists, next_cursor
+
+
+SHOW_WINDOWS = ('upcoming', 'past', 'all')
+
+
+def parse_time(value):
+    # raises ValueError like decode_cursor, so routes can answer 400
+    return datetime.fromisoformat(value) if value else None
+
+
+def show_listing(window='upcoming', after=None, limit=LISTING_PAGE_SIZE,
+                 start=None, end=None, now=None):
+    if window not in SHOW_WINDOWS:
+        raise ValueError('unknown window: %s' % window)
+    now = now or datetime.now()
+    query = db.session.query(
+        Show.id, Show.time, Show.venue_id, Show.artist_id,
+        Venue.name.label('venue_name'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).outerjoin(Venue, Venue.id == Show.venue_id).outerjoin(
+        Artist, Artist.id == Show.artist_id)
+    if window == 'upcoming':
+        query = query.filter(Show.time >= now)
+    elif window == 'past':
+        query = query.filter(Show.time < now)
+    if start:
+        query = query.filter(Show.time >= start)
+    if end:
+        query = query.filter(Show.time < end)
+
+    # past shows read newest first; both directions walk ix_show_time
+    key = tuple_(Show.time, Show.id)
+    descending = window == 'past'
+    if after:
+        after_time, after_id = decode_cursor(after, 2)
+        if (not isinstance(after_time, str) or
+                not isinstance(after_id, int) or
+                isinstance(after_id, bool)):
+            raise ValueError('malformed cursor')
+        bound = tuple_(parse_time(after_time), after_id)
+        query = query.filter(key < bound if descending else key > bound)
+    if descending:
+        query = query.order_by(Show.time.desc(), Show.id.desc())
+    else:
+        query = query.order_by(Show.time, Show.id)
+
+    shows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(shows) > limit:
+        shows = shows[:limit]
+        next_cursor = encode_cursor([shows[-1].time.isoformat(), shows[-1].id])
+    # both windows shift when the next upcoming show starts
+    next_show_at = db.session.query(func.min(Show.time)).filter(
+        Show.time >= now).scalar()
+    return {
+        'shows': shows,
+        'window': window,
+        'next_cursor': next_cursor,
+        'next_show_at': next_show_at,
+    }
+
+#----------------------------------------------------------------------------#
+# Profiles.
+#----------------------------------------------------------------------------#
+
+
+def _split_shows(shows, now):
+    # shows are ordered by time, so the upcoming ones form a suffix
+    split = len(shows)
+    for index, show in enumerate(shows):
+        if show.time >= now:
+            split = index
+            break
+    past_shows, upcoming_shows = shows[:split], shows[split:]
+    return {
+        'past_shows': past_shows,
+        'upcoming_shows': upcoming_shows,
+        'past_shows_count': len(past_shows),
+        'upcoming_shows_count': len(upcoming_shows),
+    }
+
+
+def venue_profile(venue_id, now=None):
+    venue = Venue.query.get(venue_id)
+    if venue is None:
+        return None
+    shows = db.session.query(
+        Show.id, Show.time,
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).outerjoin(Artist, Artist.id == Show.artist_id).filter(
+        Show.venue_id == venue_id).order_by(Show.time, Show.id).all()
+    profile = _split_shows(shows, now or datetime.now())
+    profile['venue'] = venue
+    return profile
+
+
+def artist_profile(artist_id, now=None):
+    artist = Artist.query.get(artist_id)
+    if artist is None:
+        return None
+    shows = db.session.query(
+        Show.id, Show.time,
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link')
+    ).outerjoin(Venue, Venue.id == Show.venue_id).filter(
+        Show.artist_id == artist_id).order_by(Show.time, Show.id).all()
+    profile = _split_shows(shows, now or datetime.now())
+    profile['artist'] = artist
+    return profile
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_RESULT_CAP = 1000
+# shorter terms have no trigram the gin_trgm_ops indexes could look up;
+# they are matched by a scan in id order that stops at the cap
+SEARCH_MIN_LENGTH = 3
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace(
+        '%', '\\%').replace('_', '\\_')
+    return '%' + escaped + '%'
+
+
+def _matching_genres(term):
+    needle = term.lower()
+    return [genre for genre, _ in genre_choices if needle in genre.lower()]
+
+
+def _search(model, term, page, per_page):
+    # ILIKE on name and city is served by the gin_trgm_ops indexes and the
+    # genre overlap by the GIN index on the genres array
+    term = term.strip()
+    page = max(page, 1)
+    pattern = _like_pattern(term)
+    conditions = [
+        model.name.ilike(pattern, escape='\\'),
+        model.city.ilike(pattern, escape='\\'),
+    ]
+    genres = _matching_genres(term)
+    if genres:
+        conditions.append(model.genres.op('&&')(
+            cast(array(genres), model.genres.type)))
+    match = or_(*conditions)
+    rank = func.greatest(func.similarity(model.name, term),
+                         func.similarity(model.city, term))
+
+    # counting and paging stop at the SEARCH_RESULT_CAP best matches; the
+    # cap comes after a total order so the count and every page see the
+    # same rows
+    order = [rank.desc(), model.name, model.id]
+    if len(term) < SEARCH_MIN_LENGTH:
+        order = [model.id]
+    capped = db.session.query(
+        model.id, model.name, model.city, model.state,
+        model.upcoming_count, rank.label('rank')
+    ).filter(match).order_by(*order).limit(SEARCH_RESULT_CAP).subquery()
+    total = db.session.query(func.count()).select_from(capped).scalar()
+
+    offset = (page - 1) * per_page
+    rows = []
+    if offset < total:
+        rows = db.session.query(
+            capped.c.id, capped.c.name, capped.c.city, capped.c.state,
+            capped.c.upcoming_count
+        ).order_by(
+            capped.c.rank.desc(), capped.c.name, capped.c.id
+        ).offset(offset).limit(min(per_page, total - offset)).all()
+    return {
+        'results': [{'id': row.id, 'name': row.name,
+                     'city': row.city, 'state': row.state,
+                     'num_upcoming_shows': row.upcoming_count}
+                    for row in rows],
+        'total': total,
+        'page': page,
+        'has_more': offset + len(rows) < total,
+    }
+
+
+def find_venues(term, page=1, per_page=SEARCH_PAGE_SIZE):
+    return _search(Venue, term, page, per_page)
+
+
+def find_artists(term, page=1, per_page=SEARCH_PAGE_SIZE):
+    return _search(Artist, term, page, per_page)
@@ -0,0 +1,8 @@
+'''
+Entry point for the async build of the API (see flaskr/asgi.py):
+
+    $ hypercorn asgi:app
+'''
+from flaskr.asgi import create_async_app
+
+app = create_async_app()
@@ -0,0 +1,35 @@
+'''
+Compares two benchmark result files scenario by scenario.
+
+    $ python benchmarks/compare.py results/1a2b3c4-sqlite-100k.json \\
+          results/5d6e7f8-sqlite-100k.json
+'''
+import argparse
+import json
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'peak_kib')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args()
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print('{} -> {} ({}, {})'.format(before['commit'], after['commit'],
+                                     after['database'], after['size']))
+    for name, result in after['scenarios'].items():
+        if name not in before['scenarios']:
+            continue
+        old = before['scenarios'][name]
+        changes = ['{} {:+.0%}'.format(metric, result[metric] / old[metric] - 1)
+                   if old[metric] else '{} n/a'.format(metric)
+                   for metric in METRICS]
+        print('{:<20} {}'.format(name, '  '.join(changes)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+'''
+Load test comparing the WSGI and ASGI builds under concurrent clients.
+
+Start one single-worker server per build against the same database,
+then point this script at both. Each target gets --clients concurrent
+clients playing quizzes (start a session, then ask for questions) for
+--duration seconds, and reports throughput and p50/p95/p99 latency.
+Needs the packages in requirements-async.txt.
+
+    $ gunicorn -w 1 -b 127.0.0.1:5000 'flaskr:create_app()'
+    $ hypercorn -w 1 -b 127.0.0.1:8000 asgi:app
+    $ python benchmarks/concurrency.py wsgi=http://127.0.0.1:5000 \\
+          asgi=http://127.0.0.1:8000 --clients 64
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+import httpx
+
+from run import RESULTS_DIR, percentile, git_commit
+
+QUESTIONS_PER_QUIZ = 5
+
+
+async def play(client, categories, deadline, timings, errors, rng):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            res = await client.post('/quizzes/sessions', params={
+                'quiz_category': rng.choice(categories)})
+            timings.append(time.perf_counter() - started)
+            session_id = res.json()['session_id']
+            for _ in range(QUESTIONS_PER_QUIZ):
+                started = time.perf_counter()
+                res = await client.post('/quizzes',
+                                        params={'session_id': session_id})
+                timings.append(time.perf_counter() - started)
+                if not res.json()['question']:
+                    break
+        except (httpx.HTTPError, ValueError, KeyError):
+            errors.append(time.perf_counter())
+
+
+async def load(url, clients, duration, seed):
+    limits = httpx.Limits(max_connections=clients,
+                          max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits,
+                                 timeout=30) as client:
+        res = await client.get('/categories')
+        categories = [int(id) for id in res.json()['categories']] + [0]
+        timings, errors = [], []
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            play(client, categories, deadline, timings, errors,
+                 random.Random(seed + index))
+            for index in range(clients)])
+        elapsed = time.perf_counter() - started
+    timings = sorted(timing * 1000 for timing in timings)
+    return {
+        'clients': clients,
+        'requests': len(timings),
+        'errors': len(errors),
+        'requests_per_second': len(timings) / elapsed,
+        'p50_ms': percentile(timings, 0.50) if timings else None,
+        'p95_ms': percentile(timings, 0.95) if timings else None,
+        'p99_ms': percentile(timings, 0.99) if timings else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('targets', nargs='+', metavar='NAME=URL')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='defaults to benchmarks/results')
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'duration': args.duration,
+        'targets': {},
+    }
+    for target in args.targets:
+        name, url = target.split('=', 1)
+        result = asyncio.run(load(url, args.clients, args.duration,
+                                  args.seed))
+        report['targets'][name] = result
+        print('{:<8} {requests_per_second:8.1f} req/s  p50 {p50_ms:8.2f}ms  '
+              'p95 {p95_ms:8.2f}ms  p99 {p99_ms:8.2f}ms  {errors} errors'
+              .format(name, **result))
+
+    output = args.output or RESULTS_DIR
+    os.makedirs(output, exist_ok=True)
+    path = os.path.join(output, '{}{}-concurrency-{}.json'.format(
+        commit, '-dirty' if dirty else '', args.clients))
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('results written to', path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''
+Synthetic trivia datasets for the benchmarks.
+
+Questions are built from a fixed pseudo-word vocabulary with a seeded
+random generator, so the same size and seed always produce the same
+rows, and search terms drawn from the vocabulary always have matches.
+
+    $ python benchmarks/datasets.py 100k --database-uri sqlite:///trivia-100k.db
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flaskr import create_app  # noqa: E402
+from flaskr.ingest import insert_questions  # noqa: E402
+from models import Question, Category, bump_version, db  # noqa: E402
+
+SIZES = {'10k': 10000, '100k': 100000, '1m': 1000000}
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+              'Sports']
+VOCABULARY_SIZE = 5000
+SEED_CHUNK_SIZE = 10000
+
+
+def vocabulary(seed=0):
+    rng = random.Random(seed)
+    syllables = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'qu',
+                 'ba', 'de', 'fi', 'go', 'hu', 'ja', 'pe', 'ro', 'su', 'wy']
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add(''.join(rng.choice(syllables)
+                          for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def generate_questions(count, category_ids, seed=0):
+    rng = random.Random(seed)
+    words = vocabulary(seed)
+    for _ in range(count):
+        yield {
+            'question': 'Which {} {} the {} of {}?'.format(
+                *rng.sample(words, 4)).capitalize(),
+            'answer': ' '.join(rng.sample(words, rng.randint(1, 3))),
+            'difficulty': rng.randint(1, 5),
+            'category': rng.choice(category_ids),
+        }
+
+
+def seed_database(app, count, seed=0, chunk_size=SEED_CHUNK_SIZE):
+    '''
+    fills an empty database with count questions; a database that
+    already holds exactly count questions is left as it is
+    '''
+    with app.app_context():
+        existing = db.session.query(db.func.count(Question.id)).scalar()
+        if existing == count:
+            return 0
+        if existing:
+            raise SystemExit('{} already holds {} questions, not {}'.format(
+                app.config['SQLALCHEMY_DATABASE_URI'], existing, count))
+        if not db.session.query(Category.id).first():
+            db.session.add_all([Category(type) for type in CATEGORIES])
+            db.session.commit()
+        category_ids = [id for (id,) in db.session.query(Category.id)]
+        chunk = []
+        for row in generate_questions(count, category_ids, seed):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                insert_questions(chunk)
+                db.session.commit()
+                chunk = []
+        insert_questions(chunk)
+        db.session.commit()
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute('ANALYZE questions')
+            db.session.commit()
+        bump_version(Question.__tablename__)
+        return count
+
+
+def default_database_uri(size):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                        'trivia-{}.db'.format(size))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return 'sqlite:///' + path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('size', choices=sorted(SIZES))
+    parser.add_argument('--database-uri',
+                        help='defaults to a SQLite file in benchmarks/data')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_uri or
+                      default_database_uri(args.size)})
+    started = time.perf_counter()
+    inserted = seed_database(app, SIZES[args.size], args.seed)
+    print('{} questions inserted in {:.1f}s'.format(
+        inserted, time.perf_counter() - started))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+'''
+Latency and memory benchmarks for the trivia API.
+
+Seeds a synthetic dataset if needed, then drives create_app() through the
+Flask test client: p50/p95/p99 latency per scenario over --requests
+requests, and the peak Python allocation of a few more under
+tracemalloc. Results are written as JSON named after the current git
+commit, so runs on different commits can be compared.
+
+    $ python benchmarks/run.py 100k
+    $ python benchmarks/run.py 1m --database-uri postgresql://localhost/trivia_bench
+'''
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flaskr import create_app, QUESTIONS_PER_PAGE  # noqa: E402
+from models import Question, Category, db  # noqa: E402
+from datasets import (SIZES, vocabulary, seed_database,  # noqa: E402
+                      default_database_uri)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'results')
+MEMORY_SAMPLES = 5
+
+
+def percentile(sorted_values, fraction):
+    # nearest rank, so the value is one that was actually measured
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def scenarios(app, seed):
+    '''
+    maps a scenario name to a function that makes one request of that
+    kind and returns the response
+    '''
+    rng = random.Random(seed)
+    words = vocabulary(seed)
+    with app.app_context():
+        total = db.session.query(db.func.count(Question.id)).scalar()
+        category_ids = [id for (id,) in db.session.query(Category.id)]
+        max_id = db.session.query(db.func.max(Question.id)).scalar()
+    pages = max(total // QUESTIONS_PER_PAGE, 1)
+    client = app.test_client()
+
+    def quiz_session():
+        res = client.post('/quizzes/sessions?quiz_category={}'.format(
+            rng.choice(category_ids)))
+        session_id = json.loads(res.data)['session_id']
+        return client.post('/quizzes?session_id={}'.format(session_id))
+
+    return {
+        'listing_first_page': lambda: client.get('/questions'),
+        'listing_offset': lambda: client.get(
+            '/questions?page={}'.format(rng.randint(1, pages))),
+        'listing_after_id': lambda: client.get(
+            '/questions?after_id={}'.format(rng.randint(0, max_id))),
+        'search': lambda: client.post(
+            '/questions?search_term={}'.format(rng.choice(words))),
+        'category': lambda: client.get(
+            '/categories/{}/questions'.format(rng.choice(category_ids))),
+        'category_stream': lambda: client.get(
+            '/categories/{}/questions?stream=1'.format(
+                rng.choice(category_ids))),
+        'category_stats': lambda: client.get('/categories/stats'),
+        'quiz_session': quiz_session,
+        'quiz_stateless': lambda: client.post(
+            '/quizzes?quiz_category={}&prev_questions={}'.format(
+                rng.choice(category_ids), ','.join(
+                    str(rng.randint(1, max_id)) for _ in range(10)))),
+    }
+
+
+def measure(request, count):
+    request()  # warm the caches, as a long-running worker would have
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        res = request()
+        res.get_data()  # drain streamed bodies inside the timing
+        timings.append((time.perf_counter() - started) * 1000)
+        if res.status_code >= 500:
+            raise RuntimeError('request failed with {}'.format(
+                res.status_code))
+    timings.sort()
+    tracemalloc.start()
+    for _ in range(MEMORY_SAMPLES):
+        request().get_data()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'requests': count,
+        'mean_ms': sum(timings) / count,
+        'p50_ms': percentile(timings, 0.50),
+        'p95_ms': percentile(timings, 0.95),
+        'p99_ms': percentile(timings, 0.99),
+        'peak_kib': peak / 1024,
+    }
+
+
+def git_commit():
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=here).decode().strip()
+        dirty = bool(subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=here).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('size', choices=sorted(SIZES))
+    parser.add_argument('--database-uri',
+                        help='defaults to a SQLite file in benchmarks/data')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--only', action='append',
+                        help='run just this scenario; may be repeated')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='defaults to benchmarks/results')
+    args = parser.parse_args()
+
+    database_uri = args.database_uri or default_database_uri(args.size)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri})
+    seed_database(app, SIZES[args.size], args.seed)
+
+    commit, dirty = git_commit()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': db.get_engine(app).dialect.name,
+        'size': args.size,
+        'scenarios': {},
+    }
+    for name, request in scenarios(app, args.seed).items():
+        if args.only and name not in args.only:
+            continue
+        result = measure(request, args.requests)
+        report['scenarios'][name] = result
+        print('{:<20} p50 {p50_ms:8.2f}ms  p95 {p95_ms:8.2f}ms  '
+              'p99 {p99_ms:8.2f}ms  peak {peak_kib:10.0f}KiB'.format(
+                  name, **result))
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        maxrss /= 1024
+    report['max_rss_kib'] = maxrss
+
+    output = args.output or RESULTS_DIR
+    os.makedirs(output, exist_ok=True)
+    path = os.path.join(output, '{}{}-{}-{}.json'.format(
+        commit, '-dirty' if dirty else '', report['database'], args.size))
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('results written to', path)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,18 @@
-from models import setup_db, Question, Category, db
+from models import (setup_db, Question, Category, QueryCache, db,
+                    bump_version, database_path)
+from .quiz import QuizSessions
+from .search import search_questions, search_rows, trigram_index_cache
+from .streaming import stream_questions, QUESTION_COLUMNS, STREAM_BATCH_SIZE
+from .ingest import (parse_batch, validate_question, category_ids,
+                     insert_questions, load_file, BATCH_MAX_ITEMS,
+                     INGEST_CHUNK_SIZE)
+import click
 import random
+from array import array
 from flask_cors import CORS
+from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func
 from sqlalchemy.exc import *
 import os
 from flask import (Flask, request,
@@ -10,13 +21,107 @@ from flask import (Flask, request,
 
 
 QUESTIONS_PER_PAGE = 10
+# other workers' inserts and deletes show up in total_questions after this
+QUESTION_COUNT_TTL = 30
+CATEGORIES_TTL = 300
+CATEGORY_STATS_TTL = 300
+QUIZ_DECK_TTL = 300
+QUIZ_SAMPLE_ATTEMPTS = 20
+QUIZ_SESSION_TTL = 1800
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+    setup_db(app, app.config.get('SQLALCHEMY_DATABASE_URI', database_path))
+    Migrate(app, db)
     cors = CORS(app, resources={r"/api/*": {"origins": "*"}})
+    question_count = QueryCache(
+        lambda: db.session.query(func.count(Question.id)).scalar(),
+        ttl=QUESTION_COUNT_TTL, table='questions')
+
+    def load_categories():
+        # the id -> type map, plus the /categories body pre-serialized
+        categories = dict(db.session.query(Category.id, Category.type))
+        return categories, json.dumps({
+            'success': True,
+            'categories': categories
+        })
+
+    category_cache = QueryCache(load_categories, ttl=CATEGORIES_TTL,
+                                table='categories')
+
+    def load_category_stats():
+        # one pass over questions; every write bumps the version anyway
+        stats = {}
+        rows = db.session.query(
+            Question.category, Question.difficulty, func.count(Question.id)
+        ).group_by(Question.category, Question.difficulty)
+        for category, difficulty, count in rows:
+            entry = stats.setdefault(category, {
+                'total_questions': 0,
+                'difficulty': {}
+            })
+            entry['total_questions'] += count
+            entry['difficulty'][str(difficulty)] = count
+        return stats
+
+    category_stats = QueryCache(load_category_stats, ttl=CATEGORY_STATS_TTL,
+                                table='questions')
+
+    question_index = trigram_index_cache()
+
+    # the ids of every question in a category (0 means all), shuffled once
+    # per load and shared by the quiz sessions and the stateless format
+    quiz_decks = {}
+    quiz_sessions = QuizSessions(ttl=QUIZ_SESSION_TTL)
+
+    def quiz_deck(category):
+        # only known categories get a deck, so clients cannot grow the map
+        if category != 0 and category not in category_cache.get()[0]:
+            abort(404)
+        if category not in quiz_decks:
+            loaded = []
+
+            def load_deck():
+                query = db.session.query(Question.id).order_by(Question.id)
+                if category > 0:
+                    query = query.filter(Question.category == category)
+                ids = array('i', (question_id for (question_id,) in query))
+                # a reload that finds the same ids keeps the old deck, so
+                # running sessions do not pin one copy per reload
+                if loaded and array('i', sorted(loaded[0])) == ids:
+                    return loaded[0]
+                random.shuffle(ids)
+                loaded[:] = [ids]
+                return ids
+            quiz_decks[category] = QueryCache(load_deck, ttl=QUIZ_DECK_TTL,
+                                              table='questions')
+        return quiz_decks[category].get()
+
+    def pick_question(category, seen):
+        # random draws from the deck find an unseen question in a few tries
+        # unless most of the category has been asked; the indexed query
+        # settles those
+        deck = quiz_deck(category)
+        skipped = set()
+        for _ in range(min(len(deck), QUIZ_SAMPLE_ATTEMPTS)):
+            question_id = deck[random.randrange(len(deck))]
+            if question_id in seen or question_id in skipped:
+                continue
+            question = Question.query.get(question_id)
+            if question is not None:
+                return question
+            # deleted since the deck was loaded
+            skipped.add(question_id)
+        query = Question.query
+        if category > 0:
+            query = query.filter(Question.category == category)
+        if seen:
+            query = query.filter(~Question.id.in_(seen))
+        return query.first()
 
     @app.after_request
     def after_request(response):
@@ -29,35 +134,49 @@ def create_app(test_config=None):
     @app.route('/questions', methods=['GET', 'POST'])
     def get_questions():
         if request.method == 'GET':
-            page = request.args.get('page', 1, type=int)
-            start = (page - 1) * QUESTIONS_PER_PAGE
-            end = start + QUESTIONS_PER_PAGE
-            questions = Question.query.all()
-            if len(questions) == 0:
+            page = max(request.args.get('page', 1, type=int), 1)
+            after_id = request.args.get('after_id', type=int)
+            total_questions = question_count.get()
+            if total_questions == 0:
                 abort(404)
-            categories = Category.query.all()
+            query = Question.query.order_by(Question.id)
+            if after_id is not None:
+                # keyset mode: deep pages cost the same as the first one
+                query = query.filter(Question.id > after_id)
+            else:
+                query = query.offset((page - 1) * QUESTIONS_PER_PAGE)
+            questions = query.limit(QUESTIONS_PER_PAGE).all()
+            categories, _ = category_cache.get()
             if len(categories) == 0:
                 abort(404)
             formatted_questions = [question.format() for question in questions]
-            formatted_categories = {}
-            for category in categories:
-                formatted_categories[category.__dict__[
-                    'id']] = category.__dict__['type']
+            next_after_id = None
+            if len(questions) == QUESTIONS_PER_PAGE:
+                next_after_id = questions[-1].id
             return jsonify({
                 'success': True,
-                'questions': formatted_questions[start: end],
-                'total_questions': len(formatted_questions),
-                'categories': formatted_categories
+                'questions': formatted_questions,
+                'total_questions': total_questions,
+                'next_after_id': next_after_id,
+                'categories': categories
             })
         if (request.method == 'POST'
                 and request.args.get('search_term') is not None):
             search_term = request.args.get('search_term')
-            response = Question.query.filter(
-                Question.question.contains(search_term)).all()
+            if request.args.get('stream', type=int):
+                # every match up to the cap, written as it is read
+                response = stream_questions(
+                    search_rows(search_term, question_index),
+                    current_cateogry=lambda categories: categories)
+                if response is None:
+                    abort(404)
+                return response
+            page = max(request.args.get('page', 1, type=int), 1)
+            response, total_questions = search_questions(
+                search_term, page, question_index, QUESTIONS_PER_PAGE)
             if len(response) == 0:
                 abort(404)
             response_formatted = [question.format() for question in response]
-            total_questions = len(response)
             current_category = []
             for question in response_formatted:
                 current_category.append(question['category'])
@@ -65,6 +184,8 @@ def create_app(test_config=None):
                 'success': True,
                 'questions': response_formatted,
                 'total_questions': total_questions,
+                'page': page,
+                'has_more': page * QUESTIONS_PER_PAGE < total_questions,
                 'current_cateogry': current_category
             })
 
@@ -73,7 +194,7 @@ def create_app(test_config=None):
                 question = request.args.get('question')
                 answer = request.args.get('answer')
                 difficulty = request.args.get('difficulty')
-                category = request.args.get('category')
+                category = request.args.get('category', type=int)
                 new_question = Question(
                     question=question,
                     answer=answer,
@@ -91,6 +212,47 @@ def create_app(test_config=None):
                     'difficulty': difficulty,
                     'category': category})
 
+    @app.route('/questions/batch', methods=['POST'])
+    def batch_questions():
+        try:
+            records = parse_batch(request.get_data())
+        except ValueError:
+            abort(400)
+        if len(records) > BATCH_MAX_ITEMS:
+            return jsonify({
+                'success': False,
+                'error': 413,
+                'message': 'At most {} questions per batch'.format(
+                    BATCH_MAX_ITEMS)
+            }), 413
+        known = category_ids()
+        rows, errors = [], []
+        for index, record in enumerate(records):
+            row, error = validate_question(record, known)
+            if error:
+                errors.append({'index': index, 'errors': error})
+            else:
+                rows.append(row)
+        if errors:
+            # all or nothing, so a corrected batch can simply be resent
+            return jsonify({
+                'success': False,
+                'error': 422,
+                'message': 'Unprocessable entity',
+                'errors': errors
+            }), 422
+        try:
+            insert_questions(rows)
+            db.session.commit()
+        except DatabaseError:
+            db.session.rollback()
+            abort(422)
+        bump_version(Question.__tablename__)
+        return jsonify({
+            'success': True,
+            'inserted': len(rows)
+        })
+
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
     def delete_question(question_id):
         try:
@@ -107,21 +269,41 @@ def create_app(test_config=None):
     @app.route('/categories', methods=['GET'])
     def get_categories():
         if request.method == 'GET':
-            categories = Category.query.all()
+            categories, payload = category_cache.get()
             if len(categories) == 0:
                 abort(404)
-            formatted_categories = {}
-            for category in categories:
-                formatted_categories[category.__dict__[
-                    'id']] = category.__dict__['type']
-            return jsonify({
-                'success': True,
-                'categories': formatted_categories
-            })
+            return app.response_class(payload, mimetype='application/json')
+
+    @app.route('/categories/stats', methods=['GET'])
+    def get_category_stats():
+        categories, _ = category_cache.get()
+        if len(categories) == 0:
+            abort(404)
+        stats = category_stats.get()
+        empty = {'total_questions': 0, 'difficulty': {}}
+        return jsonify({
+            'success': True,
+            'categories': {
+                category_id: dict(stats.get(category_id, empty),
+                                  type=category_type)
+                for category_id, category_type in categories.items()
+            },
+            'total_questions': sum(
+                entry['total_questions'] for entry in stats.values())
+        })
 
     @app.route('/categories/<int:category_id>/questions', methods=['GET'])
     def get_questions_by_category(category_id):
-        query = Question.query.filter_by(category=str(category_id)).all()
+        if request.args.get('stream', type=int):
+            response = stream_questions(
+                db.session.query(*QUESTION_COLUMNS).filter(
+                    Question.category == category_id).order_by(
+                    Question.id).yield_per(STREAM_BATCH_SIZE),
+                current_category=category_id)
+            if response is None:
+                abort(404)
+            return response
+        query = Question.query.filter_by(category=category_id).all()
         if len(query) == 0:
             abort(404)
         response = [question.format() for question in query]
@@ -132,22 +314,29 @@ def create_app(test_config=None):
             'total_questions': total_questions,
             'current_category': category_id})
 
+    @app.route('/quizzes/sessions', methods=["POST"])
+    def start_quiz():
+        quiz_category = request.args.get('quiz_category', 0, type=int)
+        session_id, total_questions = quiz_sessions.start(
+            quiz_deck(quiz_category))
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'total_questions': total_questions
+        })
+
     @app.route('/quizzes', methods=["POST"])
     def quiz():
-        quiz_category = request.args.get('quiz_category')
-        previous_questions = request.args.get('prev_questions').split(',')
+        session_id = request.args.get('session_id')
+        if session_id is not None:
+            return next_session_question(session_id)
+        quiz_category = request.args.get('quiz_category', 0, type=int)
+        previous_questions = request.args.get('prev_questions', '').split(',')
         try:
-            prev_questions = [int(q) for q in previous_questions]
-        except typeError:
-            abort(500)
-            return jsonify({'success': False})
-        if int(quiz_category) > 0:
-            cat_questions = Question.query.filter(
-                Question.category == quiz_category)
-        else:
-            cat_questions = Question.query
-        next_question = (cat_questions.filter(
-            ~ Question.id.in_(previous_questions)).first())
+            prev_questions = [int(q) for q in previous_questions if q]
+        except ValueError:
+            abort(400)
+        next_question = pick_question(quiz_category, set(prev_questions))
         if next_question is None:
             current_question = False
         else:
@@ -158,6 +347,27 @@ def create_app(test_config=None):
             'previous_questions': prev_questions
         })
 
+    def next_session_question(session_id):
+        while True:
+            try:
+                question_id = quiz_sessions.next_id(session_id)
+            except KeyError:
+                abort(404)
+            if question_id is None:
+                current_question = False
+                break
+            # skip ids deleted since the deck was dealt
+            question = Question.query.get(question_id)
+            if question is not None:
+                current_question = question.format()
+                break
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'question': current_question,
+            'remaining_questions': quiz_sessions.remaining(session_id)
+        })
+
     @app.errorhandler(400)
     def not_found(error):
         return jsonify({
@@ -190,4 +400,17 @@ def create_app(test_config=None):
             "message": "Server error"
         }), 500
 
+    @app.cli.command('load-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--chunk-size', default=INGEST_CHUNK_SIZE,
+                  show_default=True)
+    @click.option('--rejects', type=click.Path(dir_okay=False),
+                  help='Write rejected records to this file as NDJSON.')
+    def load_questions(path, chunk_size, rejects):
+        """Load questions from a CSV or NDJSON file."""
+        report = load_file(path, chunk_size, rejects)
+        click.echo('{accepted} questions loaded, {rejected} rejected in '
+                   '{elapsed:.1f}s ({rows_per_second:.0f} rows/s)'.format(
+                       **report))
+
     return app
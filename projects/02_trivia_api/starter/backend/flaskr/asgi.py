@@ -0,0 +1,521 @@
+import random
+import time
+from array import array
+from quart import Quart, request, abort, jsonify
+from sqlalchemy import select, func, delete
+from sqlalchemy.exc import DatabaseError
+from sqlalchemy.ext.asyncio import create_async_engine
+from models import (Question, Category, table_version, bump_version,
+                    database_path)
+from . import (QUESTIONS_PER_PAGE, QUESTION_COUNT_TTL, CATEGORIES_TTL,
+               CATEGORY_STATS_TTL, QUIZ_DECK_TTL, QUIZ_SAMPLE_ATTEMPTS,
+               QUIZ_SESSION_TTL)
+from .quiz import QuizSessions
+from .ingest import parse_batch, validate_question, BATCH_MAX_ITEMS
+from .search import (SEARCH_RESULT_CAP, SEARCH_INDEX_TTL, TrigramIndex,
+                     ranked_matches)
+from .streaming import (QUESTION_COLUMNS, QUESTION_KEYS, STREAM_BATCH_SIZE,
+                        stream_head, stream_item, stream_tail)
+
+questions = Question.__table__
+categories_table = Category.__table__
+
+ASYNC_POOL_SIZE = 20
+ASYNC_MAX_OVERFLOW = 20
+
+
+'''
+async_database_uri(uri)
+    the same database behind an asyncio driver: asyncpg for PostgreSQL,
+    aiosqlite for SQLite
+'''
+
+
+def async_database_uri(uri):
+    for prefix, driver in (('postgres://', 'postgresql+asyncpg://'),
+                           ('postgresql://', 'postgresql+asyncpg://'),
+                           ('sqlite://', 'sqlite+aiosqlite://')):
+        if uri.startswith(prefix):
+            return driver + uri[len(prefix):]
+    return uri
+
+
+'''
+AsyncQueryCache
+    QueryCache for coroutine loaders: keeps the result until ttl seconds
+    have passed or the version of table has been bumped
+'''
+
+
+class AsyncQueryCache:
+    def __init__(self, loader, ttl=60, table=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.table = table
+        self._entry = None
+
+    async def get(self):
+        now = time.monotonic()
+        version = table_version(self.table) if self.table else None
+        entry = self._entry
+        if entry is not None and entry[1] == version and now < entry[2]:
+            return entry[0]
+        value = await self.loader()
+        self._entry = (value, version, now + self.ttl)
+        return value
+
+
+def _format(row):
+    return dict(zip(QUESTION_KEYS, row))
+
+
+def create_async_app(test_config=None):
+    '''
+    the trivia API on Quart and an async SQLAlchemy engine with its own
+    connection pool; routes and response bodies match create_app(),
+    including its search ranking, streaming and batch endpoint
+    '''
+    app = Quart(__name__)
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+    uri = async_database_uri(
+        app.config.get('SQLALCHEMY_DATABASE_URI', database_path))
+    pool = {}
+    if not uri.startswith('sqlite'):
+        pool = {
+            'pool_size': app.config.get('ASYNC_POOL_SIZE', ASYNC_POOL_SIZE),
+            'max_overflow': app.config.get('ASYNC_MAX_OVERFLOW',
+                                           ASYNC_MAX_OVERFLOW),
+            'pool_pre_ping': True,
+        }
+    engine = create_async_engine(uri, **pool)
+    app.extensions['async_engine'] = engine
+
+    @app.after_serving
+    async def dispose_engine():
+        await engine.dispose()
+
+    @app.after_request
+    async def after_request(response):
+        response.headers.add('Access-Control-Allow-Headers',
+                             'Content-Type,Authorization,true')
+        response.headers.add('Access-Control-Allow-Methods',
+                             'GET,PATCH,POST,DELETE,OPTIONS')
+        return response
+
+    async def fetch_all(statement):
+        async with engine.connect() as connection:
+            return (await connection.execute(statement)).all()
+
+    async def fetch_scalar(statement):
+        async with engine.connect() as connection:
+            return (await connection.execute(statement)).scalar()
+
+    async def stream_statement(statement):
+        async with engine.connect() as connection:
+            async for row in await connection.stream(statement):
+                yield row
+
+    async def stream_questions(rows, **fields):
+        # stream_questions() of the sync build over an async iterator
+        try:
+            first = await rows.__anext__()
+        except StopAsyncIteration:
+            return None
+
+        async def generate():
+            categories = [first[3]]
+            try:
+                yield stream_head()
+                yield stream_item(0, first)
+                async for row in rows:
+                    yield stream_item(len(categories), row)
+                    categories.append(row[3])
+                yield stream_tail(categories, fields)
+            finally:
+                await rows.aclose()
+
+        return app.response_class(generate(), mimetype='application/json')
+
+    async def load_count():
+        return await fetch_scalar(select(func.count(questions.c.id)))
+
+    async def load_categories():
+        return dict(await fetch_all(
+            select(categories_table.c.id, categories_table.c.type)))
+
+    async def load_category_stats():
+        stats = {}
+        rows = await fetch_all(select(
+            questions.c.category, questions.c.difficulty,
+            func.count(questions.c.id)
+        ).group_by(questions.c.category, questions.c.difficulty))
+        for category, difficulty, count in rows:
+            entry = stats.setdefault(category, {
+                'total_questions': 0,
+                'difficulty': {}
+            })
+            entry['total_questions'] += count
+            entry['difficulty'][str(difficulty)] = count
+        return stats
+
+    question_count = AsyncQueryCache(load_count, ttl=QUESTION_COUNT_TTL,
+                                     table='questions')
+    category_cache = AsyncQueryCache(load_categories, ttl=CATEGORIES_TTL,
+                                     table='categories')
+    category_stats = AsyncQueryCache(load_category_stats,
+                                     ttl=CATEGORY_STATS_TTL,
+                                     table='questions')
+
+    async def load_index():
+        return TrigramIndex(await fetch_all(select(
+            questions.c.id, questions.c.question, questions.c.answer)))
+
+    # only consulted off PostgreSQL, as in the sync build
+    question_index = AsyncQueryCache(load_index, ttl=SEARCH_INDEX_TTL,
+                                     table='questions')
+
+    quiz_decks = {}
+    quiz_sessions = QuizSessions(ttl=QUIZ_SESSION_TTL)
+
+    async def quiz_deck(category):
+        if category != 0 and category not in await category_cache.get():
+            abort(404)
+        if category not in quiz_decks:
+            loaded = []
+
+            async def load_deck():
+                statement = select(questions.c.id).order_by(questions.c.id)
+                if category > 0:
+                    statement = statement.where(
+                        questions.c.category == category)
+                ids = array('i', (question_id for (question_id,)
+                                  in await fetch_all(statement)))
+                if loaded and array('i', sorted(loaded[0])) == ids:
+                    return loaded[0]
+                random.shuffle(ids)
+                loaded[:] = [ids]
+                return ids
+            quiz_decks[category] = AsyncQueryCache(
+                load_deck, ttl=QUIZ_DECK_TTL, table='questions')
+        return await quiz_decks[category].get()
+
+    async def get_question(question_id):
+        rows = await fetch_all(select(*QUESTION_COLUMNS).where(
+            questions.c.id == question_id))
+        return _format(rows[0]) if rows else None
+
+    async def pick_question(category, seen):
+        deck = await quiz_deck(category)
+        skipped = set()
+        for _ in range(min(len(deck), QUIZ_SAMPLE_ATTEMPTS)):
+            question_id = deck[random.randrange(len(deck))]
+            if question_id in seen or question_id in skipped:
+                continue
+            question = await get_question(question_id)
+            if question is not None:
+                return question
+            skipped.add(question_id)
+        statement = select(*QUESTION_COLUMNS)
+        if category > 0:
+            statement = statement.where(questions.c.category == category)
+        if seen:
+            statement = statement.where(questions.c.id.notin_(seen))
+        rows = await fetch_all(statement.limit(1))
+        return _format(rows[0]) if rows else None
+
+    @app.route('/questions', methods=['GET', 'POST'])
+    async def get_questions():
+        if request.method == 'GET':
+            page = max(request.args.get('page', 1, type=int), 1)
+            after_id = request.args.get('after_id', type=int)
+            total_questions = await question_count.get()
+            if total_questions == 0:
+                abort(404)
+            statement = select(*QUESTION_COLUMNS).order_by(questions.c.id)
+            if after_id is not None:
+                statement = statement.where(questions.c.id > after_id)
+            else:
+                statement = statement.offset(
+                    (page - 1) * QUESTIONS_PER_PAGE)
+            rows = await fetch_all(statement.limit(QUESTIONS_PER_PAGE))
+            categories = await category_cache.get()
+            if len(categories) == 0:
+                abort(404)
+            next_after_id = None
+            if len(rows) == QUESTIONS_PER_PAGE:
+                next_after_id = rows[-1][0]
+            return jsonify({
+                'success': True,
+                'questions': [_format(row) for row in rows],
+                'total_questions': total_questions,
+                'next_after_id': next_after_id,
+                'categories': categories
+            })
+        if request.args.get('search_term') is not None:
+            return await search(request.args.get('search_term'))
+        question = request.args.get('question')
+        answer = request.args.get('answer')
+        # echoed as sent, like create_app(); asyncpg will not cast strings
+        difficulty = request.args.get('difficulty')
+        category = request.args.get('category', type=int)
+        try:
+            async with engine.begin() as connection:
+                await connection.execute(questions.insert().values(
+                    question=question, answer=answer,
+                    difficulty=None if difficulty is None else int(difficulty),
+                    category=category))
+        except (ValueError, DatabaseError):
+            # create_app() rolls back and still echoes the submitted fields
+            pass
+        else:
+            bump_version('questions')
+        return jsonify({
+            'question': question,
+            'answer': answer,
+            'difficulty': difficulty,
+            'category': category})
+
+    async def indexed_matches(term):
+        index = await question_index.get()
+        return index.search(term)[:SEARCH_RESULT_CAP]
+
+    async def fetch_ordered(question_ids):
+        # rows in the order of question_ids, without ids deleted since
+        # the index was built
+        rows = {row[0]: row for row in await fetch_all(
+            select(*QUESTION_COLUMNS).where(questions.c.id.in_(question_ids)))}
+        return [rows[question_id] for question_id in question_ids
+                if question_id in rows]
+
+    def ranked_rows(term):
+        ranked = ranked_matches(term).alias('ranked')
+        return ranked, select(*QUESTION_COLUMNS).join(
+            ranked, questions.c.id == ranked.c.id).order_by(
+            ranked.c.rank.desc(), questions.c.id)
+
+    async def search_page(term, offset, limit):
+        # search_questions() of the sync build
+        if not term:
+            return [], 0
+        if engine.dialect.name == 'postgresql':
+            ranked, statement = ranked_rows(term)
+            total = await fetch_scalar(
+                select(func.count()).select_from(ranked))
+            rows = []
+            if offset < total:
+                rows = await fetch_all(statement.offset(offset).limit(
+                    min(limit, total - offset)))
+            return rows, total
+        matches = await indexed_matches(term)
+        page_ids = matches[offset:offset + limit]
+        rows = await fetch_ordered(page_ids) if page_ids else []
+        return rows, len(matches)
+
+    async def search_rows(term):
+        # search_rows() of the sync build
+        if not term:
+            return
+        if engine.dialect.name == 'postgresql':
+            async for row in stream_statement(ranked_rows(term)[1]):
+                yield row
+            return
+        matches = await indexed_matches(term)
+        for start in range(0, len(matches), STREAM_BATCH_SIZE):
+            for row in await fetch_ordered(
+                    matches[start:start + STREAM_BATCH_SIZE]):
+                yield row
+
+    async def search(search_term):
+        term = search_term.strip()
+        if request.args.get('stream', type=int):
+            response = await stream_questions(
+                search_rows(term),
+                current_cateogry=lambda categories: categories)
+            if response is None:
+                abort(404)
+            return response
+        page = max(request.args.get('page', 1, type=int), 1)
+        rows, total_questions = await search_page(
+            term, (page - 1) * QUESTIONS_PER_PAGE, QUESTIONS_PER_PAGE)
+        if len(rows) == 0:
+            abort(404)
+        response_formatted = [_format(row) for row in rows]
+        return jsonify({
+            'success': True,
+            'questions': response_formatted,
+            'total_questions': total_questions,
+            'page': page,
+            'has_more': page * QUESTIONS_PER_PAGE < total_questions,
+            'current_cateogry': [question['category']
+                                 for question in response_formatted]
+        })
+
+    @app.route('/questions/batch', methods=['POST'])
+    async def batch_questions():
+        try:
+            records = parse_batch(await request.get_data())
+        except ValueError:
+            abort(400)
+        if len(records) > BATCH_MAX_ITEMS:
+            return jsonify({
+                'success': False,
+                'error': 413,
+                'message': 'At most {} questions per batch'.format(
+                    BATCH_MAX_ITEMS)
+            }), 413
+        known = {category_id for (category_id,) in await fetch_all(
+            select(categories_table.c.id))}
+        rows, errors = [], []
+        for index, record in enumerate(records):
+            row, error = validate_question(record, known)
+            if error:
+                errors.append({'index': index, 'errors': error})
+            else:
+                rows.append(row)
+        if errors:
+            return jsonify({
+                'success': False,
+                'error': 422,
+                'message': 'Unprocessable entity',
+                'errors': errors
+            }), 422
+        if rows:
+            try:
+                async with engine.begin() as connection:
+                    await connection.execute(questions.insert(), rows)
+            except DatabaseError:
+                abort(422)
+        bump_version('questions')
+        return jsonify({
+            'success': True,
+            'inserted': len(rows)
+        })
+
+    @app.route('/questions/<int:question_id>', methods=['DELETE'])
+    async def delete_question(question_id):
+        # like create_app(), an unknown id or a failed delete still
+        # answers with success
+        try:
+            async with engine.begin() as connection:
+                result = await connection.execute(
+                    delete(questions).where(questions.c.id == question_id))
+        except DatabaseError:
+            pass
+        else:
+            if result.rowcount:
+                bump_version('questions')
+        return jsonify({
+            'success': True
+        })
+
+    @app.route('/categories', methods=['GET'])
+    async def get_categories():
+        categories = await category_cache.get()
+        if len(categories) == 0:
+            abort(404)
+        return jsonify({
+            'success': True,
+            'categories': categories
+        })
+
+    @app.route('/categories/stats', methods=['GET'])
+    async def get_category_stats():
+        categories = await category_cache.get()
+        if len(categories) == 0:
+            abort(404)
+        stats = await category_stats.get()
+        empty = {'total_questions': 0, 'difficulty': {}}
+        return jsonify({
+            'success': True,
+            'categories': {
+                category_id: dict(stats.get(category_id, empty),
+                                  type=category_type)
+                for category_id, category_type in categories.items()
+            },
+            'total_questions': sum(
+                entry['total_questions'] for entry in stats.values())
+        })
+
+    @app.route('/categories/<int:category_id>/questions', methods=['GET'])
+    async def get_questions_by_category(category_id):
+        statement = select(*QUESTION_COLUMNS).where(
+            questions.c.category == category_id).order_by(questions.c.id)
+        if request.args.get('stream', type=int):
+            response = await stream_questions(
+                stream_statement(statement), current_category=category_id)
+            if response is None:
+                abort(404)
+            return response
+        rows = await fetch_all(statement)
+        if len(rows) == 0:
+            abort(404)
+        return jsonify({
+            'success': True,
+            'questions': [_format(row) for row in rows],
+            'total_questions': len(rows),
+            'current_category': category_id})
+
+    @app.route('/quizzes/sessions', methods=['POST'])
+    async def start_quiz():
+        quiz_category = request.args.get('quiz_category', 0, type=int)
+        session_id, total_questions = quiz_sessions.start(
+            await quiz_deck(quiz_category))
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'total_questions': total_questions
+        })
+
+    @app.route('/quizzes', methods=['POST'])
+    async def quiz():
+        session_id = request.args.get('session_id')
+        if session_id is not None:
+            return await next_session_question(session_id)
+        quiz_category = request.args.get('quiz_category', 0, type=int)
+        previous_questions = request.args.get('prev_questions', '').split(',')
+        try:
+            prev_questions = [int(q) for q in previous_questions if q]
+        except ValueError:
+            abort(400)
+        current_question = await pick_question(quiz_category,
+                                               set(prev_questions)) or False
+        if current_question:
+            prev_questions.append(current_question['id'])
+        return jsonify({
+            'question': current_question,
+            'previous_questions': prev_questions
+        })
+
+    async def next_session_question(session_id):
+        while True:
+            try:
+                question_id = quiz_sessions.next_id(session_id)
+            except KeyError:
+                abort(404)
+            if question_id is None:
+                current_question = False
+                break
+            # skip ids deleted since the deck was dealt
+            current_question = await get_question(question_id)
+            if current_question is not None:
+                break
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'question': current_question,
+            'remaining_questions': quiz_sessions.remaining(session_id)
+        })
+
+    for code, message in ((400, 'Bad request'), (404, 'Not found'),
+                          (422, 'Unprocessable entity'),
+                          (500, 'Server error')):
+        async def handler(error, code=code, message=message):
+            return jsonify({
+                'success': False,
+                'error': code,
+                'message': message
+            }), code
+        app.register_error_handler(code, handler)
+
+    return app
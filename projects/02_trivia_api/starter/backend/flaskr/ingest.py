@@ -0,0 +1,168 @@
+import csv
+import io
+import json
+import time
+from models import Question, Category, bump_version, db
+
+
+INGEST_CHUNK_SIZE = 5000
+# larger batches belong in the CLI loader, which streams them in chunks
+BATCH_MAX_ITEMS = 10000
+QUESTION_FIELDS = ('question', 'answer', 'difficulty', 'category')
+
+
+'''
+parse_batch(body)
+    the records in a POST /questions/batch body, either a JSON array or
+    one JSON object per line; raises ValueError if it is neither
+'''
+
+
+def parse_batch(body):
+    text = body.decode('utf-8') if isinstance(body, bytes) else body
+    if text.lstrip().startswith('['):
+        records = json.loads(text)
+    else:
+        records = [json.loads(line) for line in text.splitlines()
+                   if line.strip()]
+    if not isinstance(records, list):
+        raise ValueError('expected a JSON array or NDJSON')
+    return records
+
+
+'''
+read_records(path)
+    yields (line number, record) from a .csv file or an NDJSON file
+    without reading the whole file into memory
+'''
+
+
+def read_records(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_num, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield line_num, json.loads(line)
+                    except ValueError:
+                        yield line_num, None
+
+
+'''
+validate_question(record, category_ids)
+    returns (row, errors): a row ready for the questions table, or a
+    dict of field -> message explaining why the record was refused
+'''
+
+
+def validate_question(record, category_ids):
+    if not isinstance(record, dict):
+        return None, {'record': 'expected a JSON object'}
+    row, errors = {}, {}
+    for field in ('question', 'answer'):
+        value = record.get(field)
+        if not isinstance(value, str) or not value.strip():
+            errors[field] = 'required'
+        else:
+            row[field] = value.strip()
+    for field in ('difficulty', 'category'):
+        try:
+            row[field] = int(record.get(field))
+        except (TypeError, ValueError):
+            errors[field] = 'must be an integer'
+    if 'difficulty' in row and not 1 <= row['difficulty'] <= 5:
+        errors['difficulty'] = 'must be between 1 and 5'
+    if 'category' in row and row['category'] not in category_ids:
+        errors['category'] = 'unknown category'
+    if errors:
+        return None, errors
+    return row, None
+
+
+def category_ids():
+    return {category_id for (category_id,) in db.session.query(Category.id)}
+
+
+def _copy(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[field] for field in QUESTION_FIELDS])
+    buffer.seek(0)
+    # COPY runs on the session's own connection, inside its transaction
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert('COPY questions ({}) FROM STDIN WITH (FORMAT csv)'
+                           .format(', '.join(QUESTION_FIELDS)), buffer)
+    finally:
+        cursor.close()
+
+
+'''
+insert_questions(rows)
+    adds validated rows with one statement, COPY on PostgreSQL and an
+    executemany elsewhere; the caller commits
+'''
+
+
+def insert_questions(rows):
+    if not rows:
+        return
+    if db.session.get_bind().dialect.name == 'postgresql':
+        _copy(rows)
+    else:
+        db.session.execute(Question.__table__.insert(), rows)
+
+
+'''
+load_file(path, chunk_size, rejects)
+    streams questions from path into the database, committing a chunk
+    at a time so memory stays bounded by chunk_size; rejected records
+    are written to rejects as NDJSON if given
+'''
+
+
+def load_file(path, chunk_size=INGEST_CHUNK_SIZE, rejects=None):
+    known = category_ids()
+    report = {'accepted': 0, 'rejected': 0}
+    reject_file = open(rejects, 'w', encoding='utf-8') if rejects else None
+
+    def flush(chunk):
+        insert_questions(chunk)
+        db.session.commit()
+        report['accepted'] += len(chunk)
+
+    started = time.perf_counter()
+    chunk = []
+    try:
+        for line_num, record in read_records(path):
+            row, errors = validate_question(record, known)
+            if errors:
+                report['rejected'] += 1
+                if reject_file:
+                    reject_file.write(json.dumps({
+                        'line': line_num, 'errors': errors,
+                        'record': record}) + '\n')
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        flush(chunk)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if reject_file:
+            reject_file.close()
+        if report['accepted']:
+            bump_version(Question.__tablename__)
+    report['elapsed'] = time.perf_counter() - started
+    report['rows_per_second'] = (
+        (report['accepted'] + report['rejected']) / report['elapsed']
+        if report['elapsed'] else 0)
+    return report
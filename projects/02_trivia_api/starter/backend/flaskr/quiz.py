@@ -0,0 +1,76 @@
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from math import gcd
+
+
+'''
+QuizSessions
+    server-side quiz state. Sessions share the shuffled deck of question
+    ids they were dealt from and keep only a cursor into it: a random
+    start and a stride coprime with the deck length, so each session
+    walks the whole deck once in its own order without copying it.
+    Sessions expire after ttl seconds without a request, and the oldest
+    ones are dropped beyond max_sessions.
+'''
+
+
+class QuizSessions:
+    def __init__(self, ttl=1800, max_sessions=10000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, deck):
+        size = len(deck)
+        start = random.randrange(size) if size else 0
+        stride = 1
+        if size > 2:
+            stride = random.randrange(1, size)
+            while gcd(stride, size) != 1:
+                stride = random.randrange(1, size)
+        session_id = secrets.token_urlsafe(16)
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            # deck, start, stride, questions asked, expiry
+            self._sessions[session_id] = [deck, start, stride, 0,
+                                          now + self.ttl]
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session_id, size
+
+    def next_id(self, session_id):
+        '''
+        returns the next question id, None once the deck is used up, and
+        raises KeyError for unknown or expired sessions
+        '''
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[4] <= now:
+                self._sessions.pop(session_id, None)
+                raise KeyError(session_id)
+            entry[4] = now + self.ttl
+            self._sessions.move_to_end(session_id)
+            deck, start, stride, asked = entry[:4]
+            if asked >= len(deck):
+                return None
+            entry[3] = asked + 1
+            return deck[(start + asked * stride) % len(deck)]
+
+    def remaining(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return len(entry[0]) - entry[3] if entry else 0
+
+    def _prune(self, now):
+        # sessions are kept in last-used order, so expired ones lead
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if entry[4] > now:
+                break
+            del self._sessions[session_id]
@@ -0,0 +1,178 @@
+import re
+from collections import defaultdict
+from itertools import islice
+from sqlalchemy import func, or_, select
+from models import Question, QueryCache, db
+from .streaming import QUESTION_COLUMNS, STREAM_BATCH_SIZE
+
+
+SEARCH_PAGE_SIZE = 10
+# matches beyond this many are neither counted, ranked nor paged through
+SEARCH_RESULT_CAP = 1000
+# shorter terms have no trigram to look up; they are matched by a scan in
+# id order that stops at the cap
+SEARCH_MIN_LENGTH = 3
+SEARCH_INDEX_TTL = 3600
+
+_word = re.compile(r'\w+')
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace(
+        '%', '\\%').replace('_', '\\_')
+    return '%' + escaped + '%'
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+'''
+TrigramIndex
+    an in-process inverted index from lowercased trigrams to question
+    ids, used where the database has no trigram index of its own
+    (SQLite test databases). A lookup intersects the posting lists of the
+    term's trigrams, smallest first, and only verifies the survivors.
+    Terms without trigrams take the first SEARCH_RESULT_CAP matches in
+    id order. Either way matches come back best first.
+'''
+
+
+class TrigramIndex:
+    def __init__(self, rows):
+        self.texts = {}
+        self.postings = defaultdict(set)
+        for question_id, question, answer in rows:
+            text = '{}\n{}'.format(question, answer).lower()
+            self.texts[question_id] = (text, question.lower())
+            for trigram in _trigrams(text):
+                self.postings[trigram].add(question_id)
+        self.ids = sorted(self.texts)
+
+    def search(self, term):
+        term = term.lower()
+        trigrams = _trigrams(term)
+        if trigrams:
+            lists = sorted((self.postings.get(trigram, set())
+                            for trigram in trigrams), key=len)
+            candidates = set(lists[0]).intersection(*lists[1:])
+            matches = [question_id for question_id in candidates
+                       if term in self.texts[question_id][0]]
+        else:
+            matches = list(islice((question_id for question_id in self.ids
+                                   if term in self.texts[question_id][0]),
+                                  SEARCH_RESULT_CAP))
+        return sorted(matches, key=lambda question_id: (
+            -self._rank(question_id, term), question_id))
+
+    def _rank(self, question_id, term):
+        text, question = self.texts[question_id]
+        words = _word.findall(text)
+        return (term in words) * 2 + (term in question)
+
+
+def trigram_index_cache():
+    return QueryCache(lambda: TrigramIndex(db.session.query(
+        Question.id, Question.question, Question.answer)),
+        ttl=SEARCH_INDEX_TTL, table='questions')
+
+
+def _postgres_match(term):
+    # ILIKE is answered from the gin_trgm_ops indexes on question and
+    # answer; word_similarity ranks whole-word hits above fragments
+    pattern = _like_pattern(term)
+    match = or_(Question.question.ilike(pattern, escape='\\'),
+                Question.answer.ilike(pattern, escape='\\'))
+    rank = func.greatest(func.word_similarity(term, Question.question),
+                         func.word_similarity(term, Question.answer))
+    return match, rank
+
+
+'''
+ranked_matches(term)
+    SELECT of (id, rank) for the SEARCH_RESULT_CAP best matches of term on
+    PostgreSQL, best first. The cap comes after a total order, so the
+    count and every page see the same set. Terms shorter than
+    SEARCH_MIN_LENGTH take the first matches in id order instead, a scan
+    that stops at the cap. Shared with the async build.
+'''
+
+
+def ranked_matches(term):
+    match, rank = _postgres_match(term)
+    order = [rank.desc(), Question.id]
+    if len(term) < SEARCH_MIN_LENGTH:
+        order = [Question.id]
+    return select([Question.id, rank.label('rank')]).where(match).order_by(
+        *order).limit(SEARCH_RESULT_CAP)
+
+
+def _postgres_page(term, offset, limit):
+    ranked = ranked_matches(term).alias('ranked')
+    total = db.session.query(func.count()).select_from(ranked).scalar()
+    questions = []
+    if offset < total:
+        questions = Question.query.join(
+            ranked, Question.id == ranked.c.id).order_by(
+            ranked.c.rank.desc(), Question.id).offset(offset).limit(
+            min(limit, total - offset)).all()
+    return questions, total
+
+
+def _indexed_page(index, term, offset, limit):
+    matches = index.get().search(term)[:SEARCH_RESULT_CAP]
+    page_ids = matches[offset:offset + limit]
+    questions = {}
+    if page_ids:
+        questions = {question.id: question for question in
+                     Question.query.filter(Question.id.in_(page_ids))}
+    # keep the rank order, dropping ids deleted since the index was built
+    return ([questions[question_id] for question_id in page_ids
+             if question_id in questions], len(matches))
+
+
+'''
+search_questions(term, page, index)
+    case-insensitive substring search over question and answer text;
+    returns (questions on the page, total matches up to the cap). index
+    is a trigram_index_cache(), only consulted off PostgreSQL.
+'''
+
+
+def search_questions(term, page=1, index=None, per_page=SEARCH_PAGE_SIZE):
+    term = term.strip()
+    offset = (max(page, 1) - 1) * per_page
+    if not term:
+        return [], 0
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return _postgres_page(term, offset, per_page)
+    return _indexed_page(index or trigram_index_cache(), term, offset,
+                         per_page)
+
+
+'''
+search_rows(term, index)
+    every match up to the cap as plain column tuples in rank order,
+    fetched a batch at a time for streaming responses
+'''
+
+
+def search_rows(term, index=None):
+    term = term.strip()
+    if not term:
+        return
+    if db.session.get_bind().dialect.name == 'postgresql':
+        ranked = ranked_matches(term).alias('ranked')
+        yield from db.session.query(*QUESTION_COLUMNS).join(
+            ranked, Question.id == ranked.c.id).order_by(
+            ranked.c.rank.desc(), Question.id).yield_per(STREAM_BATCH_SIZE)
+        return
+    matches = (index or trigram_index_cache()).get().search(
+        term)[:SEARCH_RESULT_CAP]
+    for start in range(0, len(matches), STREAM_BATCH_SIZE):
+        batch = matches[start:start + STREAM_BATCH_SIZE]
+        rows = {row[0]: row for row in db.session.query(
+            *QUESTION_COLUMNS).filter(Question.id.in_(batch))}
+        for question_id in batch:
+            if question_id in rows:
+                yield rows[question_id]
@@ -0,0 +1,46 @@
+"""initial schema
+
+Revision ID: 2d8f0b6c41e7
+Revises: 
+Create Date: 2020-06-28 11:02:54.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d8f0b6c41e7'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_table('categories',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('questions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('question', sa.String(), nullable=False),
+    sa.Column('answer', sa.String(), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('difficulty', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_questions_question_trgm', 'questions', ['question'],
+                    unique=False, postgresql_using='gin',
+                    postgresql_ops={'question': 'gin_trgm_ops'})
+    op.create_index('ix_questions_answer_trgm', 'questions', ['answer'],
+                    unique=False, postgresql_using='gin',
+                    postgresql_ops={'answer': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_questions_answer_trgm', table_name='questions')
+    op.drop_index('ix_questions_question_trgm', table_name='questions')
+    op.drop_table('questions')
+    op.drop_table('categories')
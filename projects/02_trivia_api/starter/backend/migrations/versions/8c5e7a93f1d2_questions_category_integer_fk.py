@@ -0,0 +1,89 @@
+"""questions.category as an indexed integer foreign key
+
+Revision ID: 8c5e7a93f1d2
+Revises: 2d8f0b6c41e7
+Create Date: 2020-07-05 16:40:12.873019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c5e7a93f1d2'
+down_revision = '2d8f0b6c41e7'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+# copies the string category of one id range into category_id; values
+# that are not a category id are left NULL rather than failing the cast
+BACKFILL = sa.text('''
+    UPDATE questions SET category_id = categories.id
+    FROM categories
+    WHERE questions.id > :low AND questions.id <= :high
+    AND questions.category_id IS NULL
+    AND questions.category ~ '^[0-9]+$'
+    AND categories.id = CAST(questions.category AS INTEGER)
+''')
+
+
+def _category_type():
+    columns = sa.inspect(op.get_bind()).get_columns('questions')
+    return next(column['type'] for column in columns
+                if column['name'] == 'category')
+
+
+def _has_category_fk():
+    foreign_keys = sa.inspect(op.get_bind()).get_foreign_keys('questions')
+    return any(fk['constrained_columns'] == ['category']
+               for fk in foreign_keys)
+
+
+def upgrade():
+    # trivia.psql already declares the column as an integer with a foreign
+    # key; databases created from the old model have a varchar column
+    if not isinstance(_category_type(), sa.Integer):
+        _convert_column()
+    elif not _has_category_fk():
+        op.create_foreign_key('fk_questions_category', 'questions',
+                              'categories', ['category'], ['id'],
+                              onupdate='CASCADE', ondelete='SET NULL')
+    # built without locking out writes, which needs its own transaction
+    with op.get_context().autocommit_block():
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                   'ix_questions_category ON questions (category)')
+
+
+def _convert_column():
+    op.add_column('questions', sa.Column('category_id', sa.Integer(),
+                                         nullable=True))
+    # backfill in short committed batches so the table stays writable
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        max_id = connection.execute(
+            sa.text('SELECT max(id) FROM questions')).scalar() or 0
+        for low in range(0, max_id, BACKFILL_BATCH_SIZE):
+            connection.execute(BACKFILL, low=low,
+                               high=low + BACKFILL_BATCH_SIZE)
+    # questions are only ever inserted, so rows added during the backfill
+    # lie above max_id; copy those and swap the columns under one short
+    # table lock
+    op.execute('LOCK TABLE questions IN SHARE ROW EXCLUSIVE MODE')
+    op.get_bind().execute(BACKFILL, low=max_id, high=2 ** 31 - 1)
+    op.drop_column('questions', 'category')
+    op.alter_column('questions', 'category_id', new_column_name='category')
+    op.create_foreign_key('fk_questions_category', 'questions',
+                          'categories', ['category'], ['id'],
+                          onupdate='CASCADE', ondelete='SET NULL')
+
+
+def downgrade():
+    op.drop_index('ix_questions_category', table_name='questions')
+    foreign_keys = sa.inspect(op.get_bind()).get_foreign_keys('questions')
+    for fk in foreign_keys:
+        if fk['constrained_columns'] == ['category']:
+            op.drop_constraint(fk['name'], 'questions', type_='foreignkey')
+    op.alter_column('questions', 'category', type_=sa.String(),
+                    postgresql_using='category::varchar')
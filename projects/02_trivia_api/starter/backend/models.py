@@ -1,14 +1,20 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+import time
+from sqlalchemy import (Column, String, Integer, ForeignKey, Index, DDL,
+                        event, create_engine)
 from flask_sqlalchemy import SQLAlchemy
 import json
-import flask_migrate
 
 database_name = "trivia"
 database_path = "postgres://{}/{}".format(
     'carmellasouthward@localhost:5432', database_name)
 db = SQLAlchemy()
 
+# the trigram indexes on questions need pg_trgm; other databases skip it
+event.listen(db.metadata, 'before_create', DDL(
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(
+    dialect='postgresql'))
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
@@ -23,6 +29,50 @@ def setup_db(app, database_path=database_path):
     db.create_all()
 
 
+'''
+table_version(table) / bump_version(table)
+    a per-process counter that model writes bump, so cached query
+    results can tell that their table changed
+'''
+_table_versions = {}
+
+
+def table_version(table):
+    return _table_versions.get(table, 0)
+
+
+def bump_version(table):
+    _table_versions[table] = table_version(table) + 1
+
+
+'''
+QueryCache
+    keeps the result of loader() in process memory until ttl seconds
+    have passed or the version of table has been bumped
+'''
+
+
+class QueryCache:
+    def __init__(self, loader, ttl=60, table=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.table = table
+        self._entry = None
+
+    def get(self):
+        now = time.monotonic()
+        version = table_version(self.table) if self.table else None
+        entry = self._entry
+        if entry is not None and entry[1] == version and now < entry[2]:
+            return entry[0]
+        value = self.loader()
+        self._entry = (value, version, now + self.ttl)
+        return value
+
+    def invalidate(self):
+        self._entry = None
+
+
 '''
 Question
 
@@ -31,11 +81,22 @@ Question
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        # serve case-insensitive substring search (ILIKE '%term%')
+        Index('ix_questions_question_trgm', 'question',
+              postgresql_using='gin',
+              postgresql_ops={'question': 'gin_trgm_ops'}),
+        Index('ix_questions_answer_trgm', 'answer',
+              postgresql_using='gin',
+              postgresql_ops={'answer': 'gin_trgm_ops'}),
+    )
 
     id = Column(Integer, primary_key=True)
     question = Column(String, nullable=False)
     answer = Column(String, nullable=False)
-    category = Column(String, nullable=False)
+    category = Column(Integer, ForeignKey(
+        'categories.id', onupdate='CASCADE', ondelete='SET NULL'),
+        index=True)
     difficulty = Column(Integer, nullable=False)
 
     def __init__(self, question, answer, category, difficulty):
@@ -47,13 +108,16 @@ class Question(db.Model):
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        bump_version(self.__tablename__)
 
     def update(self):
         db.session.commit()
+        bump_version(self.__tablename__)
 
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        bump_version(self.__tablename__)
 
     def format(self):
         return {
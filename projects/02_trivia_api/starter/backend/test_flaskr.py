@@ -44,6 +44,17 @@ class TriviaTestCase(unittest.TestCase):
         question_length = len(data['questions'])
         self.assertEqual(question_length, 0)
 
+    def test_get_questions_after_id(self):
+        res = self.client().get('/questions?after_id=0')
+        data = json.loads(res.data)
+        ids = [question['id'] for question in data['questions']]
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(ids, sorted(ids))
+        res = self.client().get(f'/questions?after_id={ids[-1]}')
+        data = json.loads(res.data)
+        self.assertTrue(all(question['id'] > ids[-1]
+                            for question in data['questions']))
+
     def test_post_question(self):
         quest = 'Test Question'
         answer = 'Test Answer'
@@ -57,12 +68,66 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(question['difficulty'], 5)
         self.assertTrue(question)
 
+    def test_batch_questions(self):
+        batch = [
+            {'question': 'Batch question 1', 'answer': 'One',
+             'difficulty': 1, 'category': 1},
+            {'question': 'Batch question 2', 'answer': 'Two',
+             'difficulty': 2, 'category': 2},
+        ]
+        res = self.client().post('/questions/batch', data=json.dumps(batch))
+        data = json.loads(res.data)
+        self.assertEqual(data['inserted'], 2)
+
+    def test_batch_questions_422(self):
+        batch = '\n'.join([
+            json.dumps({'question': 'Valid', 'answer': 'Yes',
+                        'difficulty': 1, 'category': 1}),
+            json.dumps({'question': 'Invalid', 'answer': 'No',
+                        'difficulty': 9, 'category': 1}),
+        ])
+        res = self.client().post('/questions/batch', data=batch)
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['errors'][0]['index'], 1)
+
     def test_question_search(self):
         search_term = 'country'
         res = self.client().post(f'/questions?search_term={search_term}')
         data = json.loads(res.data)
         self.assertEqual(data['questions'][0]['id'], 11)
 
+    def test_question_search_pages(self):
+        batch = [{'question': 'Pagination zebrafinch {}'.format(index),
+                  'answer': 'Zebrafinch', 'difficulty': 1, 'category': 1}
+                 for index in range(12)]
+        self.client().post('/questions/batch', data=json.dumps(batch))
+        seen = []
+        page = 1
+        while True:
+            res = self.client().post(
+                f'/questions?search_term=zebrafinch&page={page}')
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            seen += [question['id'] for question in data['questions']]
+            if not data['has_more']:
+                break
+            page += 1
+        self.assertGreater(page, 1)
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), data['total_questions'])
+
+    def test_question_search_short_term(self):
+        batch = [{'question': 'Which blood type is universal?',
+                  'answer': 'O-', 'difficulty': 2, 'category': 1}]
+        self.client().post('/questions/batch', data=json.dumps(batch))
+        res = self.client().post('/questions?search_term=o-')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(all('o-' in (question['question'] +
+                                     question['answer']).lower()
+                            for question in data['questions']))
+
     def test_question_search_404(self):
         search_term = 'XXXX'
         res = self.client().post(f'/questions?search_term={search_term}')
@@ -100,11 +165,25 @@ class TriviaTestCase(unittest.TestCase):
         data = json.loads(res.data)
         self.assertEqual(data['error'], 404)
 
+    def test_get_category_stats(self):
+        res = self.client().get('/categories/stats')
+        data = json.loads(res.data)
+        science = data['categories']['1']
+        self.assertEqual(science['type'], 'Science')
+        self.assertEqual(science['total_questions'],
+                         sum(science['difficulty'].values()))
+
     def test_get_questions_by_category(self):
         res = self.client().get('/categories/1/questions')
         data = json.loads(res.data)
         self.assertEqual(data['questions'][0]['id'], 20)
 
+    def test_get_questions_by_category_stream(self):
+        buffered = json.loads(
+            self.client().get('/categories/1/questions').data)
+        res = self.client().get('/categories/1/questions?stream=1')
+        self.assertEqual(json.loads(res.data), buffered)
+
     def test_get_questions_by_category_404(self):
         category_id = -1
         res = self.client().get(f'/categories/{category_id}/questions')
@@ -127,6 +206,25 @@ class TriviaTestCase(unittest.TestCase):
         data = json.loads(res.data)
         self.assertFalse(data['success'])
 
+    def test_quiz_session(self):
+        res = self.client().post('/quizzes/sessions?quiz_category=1')
+        data = json.loads(res.data)
+        session_id = data['session_id']
+        asked = set()
+        for _ in range(data['total_questions']):
+            res = self.client().post(f'/quizzes?session_id={session_id}')
+            question = json.loads(res.data)['question']
+            self.assertEqual(question['category'], 1)
+            self.assertNotIn(question['id'], asked)
+            asked.add(question['id'])
+        res = self.client().post(f'/quizzes?session_id={session_id}')
+        self.assertFalse(json.loads(res.data)['question'])
+
+    def test_quiz_session_404(self):
+        res = self.client().post('/quizzes?session_id=unknown')
+        data = json.loads(res.data)
+        self.assertEqual(data['error'], 404)
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
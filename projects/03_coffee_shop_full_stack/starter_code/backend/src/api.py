@@ -1,28 +1,78 @@
 import os
+from datetime import timezone
+from functools import wraps
 from flask import Flask, request, jsonify, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import (db_drop_and_create_all, db_create_missing,
+                              setup_db, Drink, table_version)
+from .database.menu import DrinkMenu
 from .auth.auth import AuthError, requires_auth
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
 
-db_drop_and_create_all()
+# wiping the data is opt-in; a normal start only adds missing tables
+if os.environ.get('DB_DROP_AND_CREATE') == '1':
+    db_drop_and_create_all()
+else:
+    db_create_missing()
+
+# /drinks and /drinks-detail are polled constantly and change rarely
+menu = DrinkMenu()
+
+'''
+drinks_conditional
+    passes the drink table version to the view and answers
+    If-None-Match / If-Modified-Since with 304 from that version alone,
+    before any drinks are loaded or serialized; goes below requires_auth
+    so /drinks-detail still checks the token first
+'''
+def drinks_conditional(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        version, updated_at = table_version(Drink.__tablename__)
+        last_modified = None
+        etag = '{}-{}'.format(f.__name__, version)
+        if updated_at is not None:
+            # the time keeps tags unique across a recreated database;
+            # updated_at is naive UTC and HTTP dates have whole seconds
+            last_modified = updated_at.replace(microsecond=0,
+                                               tzinfo=timezone.utc)
+            etag += updated_at.strftime('-%Y%m%d%H%M%S%f')
+        if request.if_none_match:
+            # If-None-Match uses the weak comparison (RFC 7232 3.2)
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            since = request.if_modified_since
+            if since is not None:
+                # naive before Werkzeug 2, timezone-aware from then on
+                if since.tzinfo is None:
+                    since = since.replace(tzinfo=timezone.utc)
+                since = since.astimezone(timezone.utc).replace(microsecond=0)
+            not_modified = (since is not None and last_modified is not None
+                            and last_modified <= since)
+        if not_modified:
+            response = app.response_class(status=304)
+        else:
+            response = f(*args, version=version, **kwargs)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        # clients may keep the body but must revalidate each time
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
 
 # ROUTES
 @app.route('/drinks', methods=['GET'])
-def get_drinks():
-    drinks = Drink.query.all()
-    drinks_short = [drink.short() for drink in drinks]
-    return jsonify({
-        'success': True,
-        'drinks': drinks_short,
-        'code': 200
-    })
+@drinks_conditional
+def get_drinks(version):
+    return app.response_class(menu.short_body(version),
+                              mimetype='application/json')
 
 
 @app.route('/drinks', methods=['POST'])
@@ -42,14 +92,10 @@ def new_drink(token):
 
 @app.route('/drinks-detail', methods=['GET'])
 @requires_auth('get:drinks-detail')
-def get_drink_detail(token):
-    drinks = Drink.query.all()
-    drinks_long = [drink.long() for drink in drinks]
-    return jsonify({
-        'success': True,
-        'drinks': drinks_long,
-        'code': 200
-    })
+@drinks_conditional
+def get_drink_detail(token, version):
+    return app.response_class(menu.long_body(version),
+                              mimetype='application/json')
 
 
 @app.route('/drinks/<int:id>', methods=['PATCH'])
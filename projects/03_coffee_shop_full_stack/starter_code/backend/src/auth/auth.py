@@ -1,14 +1,19 @@
-import json
 from flask import request, _request_ctx_stack, abort
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+from .jwks import JWKSCache, jwks_url
+from .token_cache import TokenCache
 
 
 AUTH0_DOMAIN = 'cwinterb.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'coffeeshop'
 
+# signing keys are fetched once and then refreshed by the cache
+jwks = JWKSCache(jwks_url(AUTH0_DOMAIN))
+# clients resend the same token until it expires; verify it only once
+verified_tokens = TokenCache()
+
 # AuthError Exception
 
 
@@ -68,25 +73,17 @@ def check_permissions(permission, payload):
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        return payload
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    rsa_key = jwks.get(unverified_header['kid'])
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -96,6 +93,7 @@ def verify_decode_jwt(token):
                 audience=API_AUDIENCE,
                 issuer='https://' + AUTH0_DOMAIN + '/'
             )
+            verified_tokens.set(token, payload)
             return payload
 
         except jwt.ExpiredSignatureError:
@@ -0,0 +1,73 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+# Verified token cache
+
+# The coffee shop backend (src/auth/) and the capstone (starter/) carry
+# identical copies of this module: the capstone is deployed to Heroku from
+# its own directory, so the two cannot import one common file. Change both
+# together; the capstone's test_app.py fails when they differ.
+
+
+class TokenCache:
+    """
+    Remembers the payloads of tokens whose signature and claims have
+    already been verified, so a token seen again skips the RS256 check.
+
+    Entries are keyed by the SHA-256 of the token, so the cache never
+    holds bearer tokens themselves. Each entry lives until the token's
+    exp claim, and tokens without one are never cached. Beyond
+    max_entries the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, token, payload):
+        expires = payload.get('exp')
+        if not isinstance(expires, (int, float)) or expires <= time.time():
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (payload, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
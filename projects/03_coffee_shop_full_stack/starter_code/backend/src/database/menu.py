@@ -0,0 +1,55 @@
+import json
+import threading
+
+from .models import Drink
+
+'''
+DrinkMenu
+    an in-process read model of the drink table. It holds every drink
+    parsed once, plus the /drinks and /drinks-detail response bodies
+    already serialized, and rebuilds them when the drink table version
+    (see TableVersion) differs from the one they were built at
+'''
+class DrinkMenu:
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    '''
+    snapshot(version)
+        the (version, drinks, short_body, long_body) for the given table
+        version, rebuilt first if it was built at another one
+    '''
+    def snapshot(self, version):
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot[0] == version:
+            return snapshot
+        with self._lock:
+            # another thread may have rebuilt it while we waited
+            if self._snapshot is None or self._snapshot[0] != version:
+                self._snapshot = self._build(version)
+            return self._snapshot
+
+    def short_body(self, version):
+        return self.snapshot(version)[2]
+
+    def long_body(self, version):
+        return self.snapshot(version)[3]
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _build(self, version):
+        drinks = [drink.long() for drink in Drink.query.order_by(Drink.id)]
+        short = [{
+            'id': drink['id'],
+            'title': drink['title'],
+            'recipe': [{'color': r['color'], 'parts': r['parts']}
+                       for r in drink['recipe']]
+        } for drink in drinks]
+        return (
+            version,
+            drinks,
+            json.dumps({'success': True, 'drinks': short, 'code': 200}),
+            json.dumps({'success': True, 'drinks': drinks, 'code': 200}),
+        )
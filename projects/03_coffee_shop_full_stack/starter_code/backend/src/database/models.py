@@ -1,5 +1,10 @@
 import os
-from sqlalchemy import Column, String, Integer
+import sqlite3
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, select, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.pool import QueuePool
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -9,6 +14,42 @@ database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filenam
 
 db = SQLAlchemy()
 
+'''
+SQLite profile
+    WAL lets readers run alongside the single writer instead of
+    blocking on it, synchronous=NORMAL only syncs at checkpoints (safe
+    in WAL mode, at worst the last commits are lost on power failure),
+    mmap serves reads from the page cache, and busy_timeout makes a
+    second writer wait for the lock rather than fail with "database is
+    locked". The pool keeps connections (and their mmap) open between
+    requests instead of reconnecting each time.
+'''
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('busy_timeout', 5000),
+    ('foreign_keys', 'ON'),
+)
+
+def sqlite_engine_options():
+    return {
+        'poolclass': QueuePool,
+        'pool_size': 5,
+        'max_overflow': 10,
+        # pooled connections move between request threads
+        'connect_args': {'check_same_thread': False, 'timeout': 5},
+    }
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute('PRAGMA {} = {}'.format(name, value))
+    cursor.close()
+
 '''
 setup_db(app)   
     binds a flask application and a SQLAlchemy service
@@ -16,6 +57,7 @@ setup_db(app)
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", sqlite_engine_options())
     db.app = app
     db.init_app(app)
 
@@ -28,6 +70,68 @@ db_drop_and_create_all()
 def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
+    bump_table_version(Drink.__tablename__)
+    db.session.commit()
+
+'''
+db_create_missing()
+    creates only the tables that do not exist yet and keeps the data
+    in the others, so restarting a worker is cheap and harmless
+'''
+def db_create_missing():
+    try:
+        db.create_all()
+    except OperationalError:
+        # lost a race with another worker creating the same table
+        db.create_all()
+    if table_version(Drink.__tablename__)[1] is None:
+        try:
+            bump_table_version(Drink.__tablename__)
+            db.session.commit()
+        except IntegrityError:
+            # another worker starting at the same time got there first
+            db.session.rollback()
+
+'''
+TableVersion
+    a version counter and modification time per table, bumped in the
+    same transaction as every write to that table, so all workers agree
+    on when their cached copies of it went stale
+'''
+class TableVersion(db.Model):
+    __tablename__ = 'table_versions'
+    name = Column(String(80), primary_key=True)
+    version = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+'''
+bump_table_version(name)
+    increments the version of a table as part of the current
+    transaction; the caller commits
+'''
+def bump_table_version(name):
+    table = TableVersion.__table__
+    now = datetime.utcnow()
+    result = db.session.execute(table.update().where(
+        table.c.name == name).values(version=table.c.version + 1,
+                                     updated_at=now))
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(
+            name=name, version=1, updated_at=now))
+
+'''
+table_version(name)
+    (version, updated_at) of a table, read with one primary key lookup;
+    (0, None) before its first write
+'''
+def table_version(name):
+    table = TableVersion.__table__
+    row = db.session.execute(select(
+        [table.c.version, table.c.updated_at]).where(
+        table.c.name == name)).first()
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at
 
 '''
 Drink
@@ -47,7 +151,6 @@ class Drink(db.Model):
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
         short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
         return {
             'id': self.id,
@@ -77,6 +180,7 @@ class Drink(db.Model):
     '''
     def insert(self):
         db.session.add(self)
+        bump_table_version(self.__tablename__)
         db.session.commit()
 
     '''
@@ -89,6 +193,7 @@ class Drink(db.Model):
     '''
     def delete(self):
         db.session.delete(self)
+        bump_table_version(self.__tablename__)
         db.session.commit()
 
     '''
@@ -101,6 +206,7 @@ class Drink(db.Model):
             drink.update()
     '''
     def update(self):
+        bump_table_version(self.__tablename__)
         db.session.commit()
 
     def __repr__(self):
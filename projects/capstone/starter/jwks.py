@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import time
+from urllib.request import urlopen
+
+
+# JSON Web Key Set cache
+
+# The coffee shop backend (src/auth/) and the capstone (starter/) carry
+# identical copies of this module: the capstone is deployed to Heroku from
+# its own directory, so the two cannot import one common file. Change both
+# together; the capstone's test_app.py fails when they differ.
+
+
+class JWKSCache:
+    """
+    Holds the signing keys of a JWKS endpoint by kid, so verifying a
+    token does not fetch the key set each time.
+
+    Keys are kept for ttl seconds. Within refresh_margin seconds of
+    expiry a lookup starts a background refresh, so requests do not wait
+    on it. A kid that is not in the set triggers one synchronous refresh,
+    at most every min_refresh_interval seconds, to pick up rotated keys
+    without letting made-up kids hammer the endpoint. If a refresh fails
+    the keys already held keep being served.
+    """
+
+    def __init__(self, url, ttl=3600, refresh_margin=300,
+                 min_refresh_interval=30):
+        self.url = url
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._expires = 0
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self, kid):
+        now = time.monotonic()
+        if now >= self._expires:
+            self.refresh(now)
+        elif now >= self._expires - self.refresh_margin:
+            self._refresh_in_background()
+        key = self._keys.get(kid)
+        if key is None and self._may_refresh(now):
+            self.refresh(now)
+            key = self._keys.get(kid)
+        return key
+
+    def refresh(self, requested=None):
+        with self._lock:
+            now = time.monotonic()
+            if (requested is not None and self._last_refresh is not None
+                    and self._last_refresh >= requested):
+                # another thread refreshed while this one waited
+                return True
+            self._last_refresh = now
+            try:
+                keys = self._fetch()
+            except (OSError, ValueError, KeyError):
+                # keep what we have and try again shortly
+                self._expires = now + self.min_refresh_interval
+                return False
+            self._keys = keys
+            self._expires = now + self.ttl
+            return True
+
+    def _may_refresh(self, now):
+        return (self._last_refresh is None or
+                now - self._last_refresh >= self.min_refresh_interval)
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+        threading.Thread(target=run, daemon=True).start()
+
+    def _fetch(self):
+        with urlopen(self.url, timeout=10) as response:
+            jwks = json.loads(response.read())
+        return {key['kid']: {
+            'kty': key['kty'],
+            'kid': key['kid'],
+            'use': key.get('use', 'sig'),
+            'n': key['n'],
+            'e': key['e']
+        } for key in jwks['keys'] if key.get('kty') == 'RSA'}
+
+
+def jwks_url(domain):
+    """
+    The JWKS_URL environment variable points verification at another key
+    set: a local stub issuer's URL, a file:// URL or a plain file path,
+    so tests can run offline.
+    """
+    url = os.environ.get('JWKS_URL')
+    if not url:
+        return f'https://{domain}/.well-known/jwks.json'
+    if '://' not in url:
+        return 'file://' + os.path.abspath(url)
+    return url
@@ -8,6 +8,11 @@ from datetime import datetime, time as time_
 from app import create_app
 from models import *
 
+HERE = os.path.dirname(os.path.abspath(__file__))
+COFFEE_SHOP_AUTH = os.path.join(
+    HERE, '..', '..', '03_coffee_shop_full_stack', 'starter_code', 'backend',
+    'src', 'auth')
+
 
 class AgencyTestCase(unittest.TestCase):
 
@@ -90,6 +95,15 @@ class AgencyTestCase(unittest.TestCase):
         res = self.client().post('/projects/1/delete')
         self.assertEqual(res.status_code, 200)
 
+    @unittest.skipUnless(os.path.isdir(COFFEE_SHOP_AUTH),
+                         'coffee shop backend not checked out')
+    def testAuthModulesMatchCoffeeShop(self):
+        # the two backends deploy separately, so these are kept as copies
+        for name in ('token_cache.py', 'jwks.py'):
+            with open(os.path.join(HERE, name), 'rb') as ours, open(
+                    os.path.join(COFFEE_SHOP_AUTH, name), 'rb') as theirs:
+                self.assertEqual(ours.read(), theirs.read(), name)
+
 
 if __name__ == "__main__":
     unittest.main()